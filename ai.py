@@ -1,55 +1,271 @@
 import os
-import random
+import json
+import time
+import logic
+from array import array
+
+NNUE_PATH = os.path.join("assets", "nnue.npz")
+EVAL_WEIGHTS_PATH = os.path.join("assets", "eval_weights.json")
+
+# Neural evaluator, loaded on first use if NumPy and a network file are available
+nnue_evaluator = None
+nnue_checked = False
+nodes_searched = 0  # Interior nodes (depth >= 1), so batched and single leaf evaluation count the same
 
 def ai_initialization(positions, color):
     color = "black" if color == "white" else "white"
     pass
 
-def evaluate_board(board):
+def load_nnue(path=NNUE_PATH):
+    global nnue_evaluator, nnue_checked
+    nnue_checked = True
+    try:
+        import nnue
+    except ImportError:
+        return None
+    if nnue.np is None or not os.path.exists(path):
+        return None
+    nnue_evaluator = nnue.NNUE(nnue.load_network(path))
+    return nnue_evaluator
+
+def load_piece_values(path=EVAL_WEIGHTS_PATH):
+    """
+    Piece values written by tuning.py, or the hand-set defaults if there is no weights file.
+    """
     piece_values = {"pawn": 1, "knight": 3, "bishop": 3, "rook": 5, "queen": 9, "king": 100}
+    if os.path.exists(path):
+        with open(path) as weights_file:
+            piece_values.update(json.load(weights_file))
+    return piece_values
+
+PIECE_VALUES = load_piece_values()
+
+def evaluate_board(board):
     score = 0
     for color, pieces in board.items():
         for piece, positions in pieces.items():
-            value = piece_values[piece] * len(positions)
+            value = PIECE_VALUES[piece] * len(positions)
             score += value if color == "white" else -value
     return score
 
+MAX_PLY = 64
+MAX_MOVES = 256  # More than any reachable position has
+
+# Signed material value of each mailbox code, white positive
+CODE_VALUES = [0] + [
+    PIECE_VALUES[piece] * (1 if color == "white" else -1)
+    for color in logic.COLORS
+    for piece in logic.PIECE_TYPES
+]
+# Move ordering: captures by most valuable victim, then least valuable attacker
+VICTIM_ORDER = [0] + [10 * (piece + 1) for _ in logic.COLORS for piece in range(len(logic.PIECE_TYPES))]
+
+class SearchBoard:
+    """
+    Mailbox board used by the search, with an incrementally updated hash and material score.
+    Each board owns preallocated per-ply move and score buffers, so searching allocates no move lists.
+    """
+    __slots__ = ("squares", "hash", "material", "moves", "scores")
+
+    def __init__(self, positions=None, player="white"):
+        self.moves = array("H", bytes(2 * MAX_PLY * MAX_MOVES))
+        self.scores = array("i", bytes(4 * MAX_PLY * MAX_MOVES))
+        self.load(positions or {}, player)
+
+    def load(self, positions, player):
+        self.squares = logic.squares_from_positions(positions)
+        self.hash = logic.zobrist_hash(positions, player)
+        self.material = sum(CODE_VALUES[code] for code in self.squares)
+
 def generate_moves(board, color):
-    moves = []
-    for piece, positions in board[color].items():
-        for pos in positions:
-            new_pos = random.choice(["a3", "b4", "c5", "d6", "e7", "f8"])  # Dummy moves
-            moves.append((pos, new_pos))
-    return moves
-
-def minimax(board, depth, alpha, beta, maximizing_player):
+    """
+    Packed moves for color as a list, for callers outside the search loop.
+    """
+    end = logic.generate_packed_moves(board.squares, logic.COLORS.index(color), board.moves, 0)
+    return list(board.moves[:end])
+
+def make_move(board, move, evaluator=None):
+    """
+    Play a packed move on board in place and return the captured piece code for unmake_move.
+    """
+    squares = board.squares
+    from_square, to_square = move & 63, (move >> 6) & 63
+    piece, captured = squares[from_square], squares[to_square]
+    # A promoting pawn becomes the piece in the promotion bits, of the same color
+    new_piece = piece + logic.PROMOTION_OFFSETS[(move >> 12) & 3] if move & logic.PROMOTION_FLAG else piece
+    squares[from_square], squares[to_square] = logic.EMPTY, new_piece
+
+    zobrist = logic.ZOBRIST_BY_CODE
+    board.hash ^= zobrist[piece][from_square] ^ zobrist[new_piece][to_square] ^ logic.ZOBRIST_BLACK_TO_MOVE
+    board.material += CODE_VALUES[new_piece] - CODE_VALUES[piece] - CODE_VALUES[captured]
+    if captured:
+        board.hash ^= zobrist[captured][to_square]
+
+    if evaluator is not None:
+        evaluator.push()
+        evaluator.update(piece, new_piece, from_square, to_square, captured)
+    return captured
+
+def unmake_move(board, move, captured, evaluator=None):
+    squares = board.squares
+    from_square, to_square = move & 63, (move >> 6) & 63
+    new_piece = squares[to_square]
+    piece = new_piece - logic.PROMOTION_OFFSETS[(move >> 12) & 3] if move & logic.PROMOTION_FLAG else new_piece
+    squares[from_square], squares[to_square] = piece, captured
+
+    zobrist = logic.ZOBRIST_BY_CODE
+    board.hash ^= zobrist[piece][from_square] ^ zobrist[new_piece][to_square] ^ logic.ZOBRIST_BLACK_TO_MOVE
+    board.material -= CODE_VALUES[new_piece] - CODE_VALUES[piece] - CODE_VALUES[captured]
+    if captured:
+        board.hash ^= zobrist[captured][to_square]
+
+    if evaluator is not None:
+        evaluator.pop()
+
+class SearchAborted(Exception):
+    pass
+
+# Transposition table entry flags
+EXACT, LOWER, UPPER = 0, 1, 2
+TABLE_BITS = 20  # 1M slots, about 20 MB
+
+class TranspositionTable:
+    """
+    Fixed-size transposition table: position hash -> (depth, score, flag, best move) in one slot
+    per hash & mask, kept in flat arrays. A new entry always replaces the slot's previous one,
+    so memory stays bounded however long the table is kept.
+    """
+    __slots__ = ("mask", "keys", "depths", "scores", "flags", "moves")
+
+    def __init__(self, bits=TABLE_BITS):
+        size = 1 << bits
+        self.mask = size - 1
+        self.keys = array("q", [-1]) * size  # Hashes are non-negative, -1 marks an empty slot
+        self.depths = array("B", bytes(size))
+        self.scores = array("d", bytes(8 * size))
+        self.flags = array("B", bytes(size))
+        self.moves = array("H", bytes(2 * size))
+
+    def get(self, key, default=None):
+        slot = key & self.mask
+        if self.keys[slot] != key:
+            return default
+        return self.depths[slot], self.scores[slot], self.flags[slot], self.moves[slot]
+
+    def __setitem__(self, key, entry):
+        slot = key & self.mask
+        self.keys[slot] = key
+        self.depths[slot], self.scores[slot], self.flags[slot], self.moves[slot] = entry
+
+def minimax(board, depth, alpha, beta, maximizing_player, evaluator=None, table=None, stop=None, ply=0):
+    """
+    Alpha-beta search on a SearchBoard, white maximizing. table is an optional transposition table
+    (hash -> (depth, score, flag, best move)), a TranspositionTable kept by the caller across searches;
+    stop is an optional threading.Event that aborts the search with SearchAborted.
+    Moves of this node live in board.moves[ply * MAX_MOVES:] and are ordered in place.
+    """
+    global nodes_searched
+    if stop is not None and stop.is_set():
+        raise SearchAborted()
     if depth == 0:
-        return evaluate_board(board), None
-    
-    color = "white" if maximizing_player else "black"
-    moves = generate_moves(board, color)
-    
-    if maximizing_player:
-        max_eval, best_move = float("-inf"), None
-        for move in moves:
-            eval_score, _ = minimax(board, depth - 1, alpha, beta, False)
-            if eval_score > max_eval:
-                max_eval, best_move = eval_score, move
+        return (evaluator.evaluate("white" if maximizing_player else "black") if evaluator is not None else board.material), 0
+    nodes_searched += 1
+
+    moves, scores, squares = board.moves, board.scores, board.squares
+    start = ply * MAX_MOVES
+    end = logic.generate_packed_moves(squares, 0 if maximizing_player else 1, moves, start)
+    if end == start:
+        return (evaluator.evaluate("white" if maximizing_player else "black") if evaluator is not None else board.material), 0
+
+    table_move = 0
+    if table is not None:
+        entry = table.get(board.hash)
+        if entry is not None:
+            entry_depth, entry_score, flag, table_move = entry
+            if entry_depth >= depth and (
+                flag == EXACT or (flag == LOWER and entry_score >= beta) or (flag == UPPER and entry_score <= alpha)
+            ):
+                return entry_score, table_move
+    alpha_start, beta_start = alpha, beta
+
+    if depth == 1 and evaluator is not None:
+        leaf = evaluator.evaluate_children(squares, moves, start, end, "black" if maximizing_player else "white")
+        best = int(leaf.argmax() if maximizing_player else leaf.argmin())
+        return float(leaf[best]), moves[start + best]
+
+    # Score moves for ordering: previous best move first, then captures
+    for i in range(start, end):
+        move = moves[i]
+        if move == table_move:
+            scores[i] = 1 << 20
+        elif move & logic.CAPTURE_FLAG:
+            scores[i] = VICTIM_ORDER[squares[(move >> 6) & 63]] - VICTIM_ORDER[squares[move & 63]] // 10
+        else:
+            scores[i] = 0
+
+    best_score = float("-inf") if maximizing_player else float("inf")
+    best_move = 0
+    for i in range(start, end):
+        # Pick the best remaining move by swapping it into place
+        best_index = i
+        for j in range(i + 1, end):
+            if scores[j] > scores[best_index]:
+                best_index = j
+        if best_index != i:
+            moves[i], moves[best_index] = moves[best_index], moves[i]
+            scores[i], scores[best_index] = scores[best_index], scores[i]
+        move = moves[i]
+
+        captured = make_move(board, move, evaluator)
+        try:
+            eval_score, _ = minimax(board, depth - 1, alpha, beta, not maximizing_player, evaluator, table, stop, ply + 1)
+        finally:
+            unmake_move(board, move, captured, evaluator)
+
+        if maximizing_player:
+            if eval_score > best_score:
+                best_score, best_move = eval_score, move
             alpha = max(alpha, eval_score)
-            if beta <= alpha:
-                break
-        return max_eval, best_move
-    else:
-        min_eval, best_move = float("inf"), None
-        for move in moves:
-            eval_score, _ = minimax(board, depth - 1, alpha, beta, True)
-            if eval_score < min_eval:
-                min_eval, best_move = eval_score, move
+        else:
+            if eval_score < best_score:
+                best_score, best_move = eval_score, move
             beta = min(beta, eval_score)
-            if beta <= alpha:
-                break
-        return min_eval, best_move
+        if beta <= alpha:
+            break
+
+    if table is not None:
+        flag = UPPER if best_score <= alpha_start else LOWER if best_score >= beta_start else EXACT
+        table[board.hash] = (depth, best_score, flag, best_move)
+    return best_score, best_move
+
+def ai_move(board, depth=3, color="white", use_nnue=True):
+    """
+    Best packed move for color in a positions dict, or None if it has no moves.
+    """
+    search_board = SearchBoard(board, color)
+    evaluator = None
+    if use_nnue:
+        if not nnue_checked:
+            load_nnue()
+        evaluator = nnue_evaluator
+        if evaluator is not None:
+            evaluator.refresh(search_board.squares)
+    _, best_move = minimax(search_board, depth, float("-inf"), float("inf"), color == "white", evaluator)
+    return best_move or None
 
-def ai_move(board, depth=3):
-    _, best_move = minimax(board, depth, float("-inf"), float("inf"), True)
-    return best_move
+def timed_move(board, color, max_depth=3, time_budget=None):
+    """
+    Iterative deepening: search depth 1, 2, ... up to max_depth while the time budget allows.
+    Returns (best move, depth reached).
+    """
+    start = time.monotonic()
+    best_move, depth_reached = None, 0
+    for depth in range(1, max_depth + 1):
+        move = ai_move(board, depth, color)
+        if move is not None:
+            best_move, depth_reached = move, depth
+        elapsed = time.monotonic() - start
+        # The next depth costs several times the previous ones, don't start it if it can't finish
+        if time_budget is not None and elapsed * 4 > time_budget:
+            break
+    return best_move, depth_reached
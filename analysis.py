@@ -0,0 +1,113 @@
+import copy
+import queue
+import threading
+
+import ai
+
+ANALYSIS_LINES = 3
+
+class Analyzer:
+    """
+    Background multi-PV analysis of the current position.
+    Deepens until the position changes or max_depth is reached, putting every finished depth
+    on a queue for the GUI, with lines as (score, [packed moves]); the bounded transposition
+    table is kept between positions so a new position starts from what the previous searches found.
+    """
+    def __init__(self, lines=ANALYSIS_LINES, max_depth=ai.MAX_PLY):
+        self.lines = lines
+        self.max_depth = min(max_depth, ai.MAX_PLY)  # The search's move buffers hold MAX_PLY plies
+        self.table = ai.TranspositionTable()
+        self.results = queue.Queue()
+        self.stop = threading.Event()
+        self.wake = threading.Event()
+        self.lock = threading.Lock()
+        self.pending = None
+        self.generation = 0
+        self.running = True
+        self.latest_result = None
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def set_position(self, board, player):
+        """
+        Analyze a new position, interrupting the current search.
+        """
+        with self.lock:
+            self.generation += 1
+            self.pending = (copy.deepcopy(board), player, self.generation)
+            self.latest_result = None
+        self.stop.set()
+        self.wake.set()
+
+    def latest(self):
+        """
+        Newest result for the current position, or None; never blocks.
+        """
+        while True:
+            try:
+                result = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if result["generation"] == self.generation:
+                self.latest_result = result
+        return self.latest_result
+
+    def close(self):
+        self.running = False
+        self.stop.set()
+        self.wake.set()
+
+    def _run(self):
+        board = ai.SearchBoard()  # Reused for every position, with its move buffers
+        while self.running:
+            self.wake.wait()
+            with self.lock:
+                self.wake.clear()
+                self.stop.clear()
+                job, self.pending = self.pending, None
+            if job is None:
+                continue
+            positions, player, generation = job
+            board.load(positions, player)
+            root_moves = ai.generate_moves(board, player)
+            try:
+                for depth in range(1, self.max_depth + 1):
+                    lines = self._search_root(board, player, root_moves, depth)
+                    # Next iteration searches the best lines first
+                    root_moves = [variation[0] for _, variation in lines]
+                    self.results.put({"generation": generation, "player": player, "depth": depth, "lines": lines[:self.lines]})
+            except ai.SearchAborted:
+                continue
+
+    def _search_root(self, board, player, root_moves, depth):
+        maximizing = player == "white"
+        lines = []
+        for move in root_moves:
+            captured = ai.make_move(board, move)
+            try:
+                score, _ = ai.minimax(board, depth - 1, float("-inf"), float("inf"), not maximizing, table=self.table, stop=self.stop, ply=1)
+                lines.append((score, [move] + self._principal_variation(board, not maximizing, depth - 1)))
+            finally:
+                ai.unmake_move(board, move, captured)
+        lines.sort(key=lambda line: line[0], reverse=maximizing)
+        return lines
+
+    def _principal_variation(self, board, white_to_move, depth):
+        """
+        Follow the best packed moves stored in the transposition table.
+        """
+        played = []
+        for _ in range(depth):
+            entry = self.table.get(board.hash)
+            if entry is None or not entry[3]:
+                break
+            move = entry[3]
+            code = board.squares[move & 63]
+            # Guard against hash collisions: the moving piece must belong to the side to move
+            if not code or (code <= 6) != white_to_move:
+                break
+            played.append((move, ai.make_move(board, move)))
+            white_to_move = not white_to_move
+        variation = [move for move, _ in played]
+        for move, captured in reversed(played):
+            ai.unmake_move(board, move, captured)
+        return variation
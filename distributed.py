@@ -0,0 +1,345 @@
+import os
+import sys
+import copy
+import json
+import time
+import random
+import socket
+import tempfile
+import threading
+from collections import deque
+from multiprocessing import Process
+
+import ai
+import logic
+import journal
+import position_index
+
+HOST, PORT = "0.0.0.0", 5556
+LEASE_TIMEOUT = 60.0  # Seconds a worker may hold a unit before it is handed to someone else
+MAX_ATTEMPTS = 3
+SELFPLAY_MAX_PLIES = 200
+
+
+def evaluate_unit(payload):
+    """
+    Score every position of the unit and return its best move.
+    """
+    results = []
+    for entry in payload["positions"]:
+        board = ai.SearchBoard(entry["board"], entry["player"])
+        score, move = ai.minimax(board, payload.get("depth", 3), float("-inf"), float("inf"), entry["player"] == "white")
+        results.append({"score": score, "move": logic.move_to_string(move) if move else None})
+    return results
+
+
+def selfplay_unit(payload):
+    """
+    Play one engine-vs-engine game; the first moves are random so games differ.
+    """
+    rng = random.Random(payload.get("seed"))
+    board = ai.SearchBoard(logic.INITIAL_POSITIONS, "white")
+    player, moves, winner = "white", [], None
+    for ply in range(payload.get("max_plies", SELFPLAY_MAX_PLIES)):
+        if ply < payload.get("random_plies", 4):
+            candidates = ai.generate_moves(board, player)
+            move = rng.choice(candidates) if candidates else 0
+        else:
+            _, move = ai.minimax(board, payload.get("depth", 2), float("-inf"), float("inf"), player == "white")
+        if not move:
+            break
+        captured = ai.make_move(board, move)
+        moves.append(logic.move_to_string(move))
+        if captured and (captured - 1) % 6 == logic.PIECE_TYPES.index("king"):
+            winner = player
+            break
+        player = "black" if player == "white" else "white"
+    return {"moves": moves, "winner": winner}
+
+
+def index_unit(payload):
+    """
+    Replay a finished self-play game into position index rows, so the coordinator only has to insert them.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "game.acpj")
+        write_selfplay_journal(payload["moves"], payload["winner"], path)
+        _, winner, entries = position_index.game_entries(path)
+    return {"game": payload["game"], "winner": winner, "entries": entries}
+
+
+UNIT_KINDS = {"evaluate": evaluate_unit, "selfplay": selfplay_unit, "index": index_unit}
+
+
+def index_follow_up(unit_id, result):
+    """
+    The "index" unit for a finished self-play unit.
+    """
+    return {"id": f"index-{unit_id}", "kind": "index", "payload": {"game": unit_id, **result}}
+
+
+def write_selfplay_journal(moves, winner, path):
+    """
+    Store a self-play game as a journal so it can be archived and indexed like a played game.
+    """
+    positions = copy.deepcopy(logic.INITIAL_POSITIONS)
+    with journal.JournalWriter(path) as writer:
+        writer.record_snapshot(positions, "white")
+        for move in moves:
+            from_coord, to_coord = move[:2], move[2:4]
+            piece_color, piece_type = next(
+                (color, piece)
+                for color, pieces in positions.items()
+                for piece, coords in pieces.items()
+                if from_coord in coords
+            )
+            logic.apply_move(positions, piece_color, piece_type, from_coord, to_coord)
+            writer.record_move(piece_color, piece_type, from_coord, to_coord)
+            if len(move) == 5:
+                promoted_piece = logic.PROMOTION_PIECES["nbrq".index(move[4])]
+                logic.promote(positions, piece_color, to_coord, promoted_piece)
+                writer.record_promotion(to_coord, promoted_piece)
+        if winner:
+            writer.record_end(winner)
+
+
+class Coordinator:
+    """
+    Hands out work units to workers over TCP (JSON lines) and collects their results.
+    Every unit handed out is a lease: if the worker disconnects or does not answer before
+    the lease expires, the unit is queued again, up to MAX_ATTEMPTS times.
+    follow_ups maps a unit kind to a function (unit id, result) -> unit that is queued once
+    a unit of that kind has a result, e.g. index_follow_up for "selfplay".
+    """
+    def __init__(self, units, host=HOST, port=PORT, lease_timeout=LEASE_TIMEOUT, max_attempts=MAX_ATTEMPTS, follow_ups=None):
+        self.units = {}
+        self.pending = deque()
+        self.leases = {}  # unit id -> (worker address, deadline)
+        self.attempts = {}
+        self.results = {}
+        self.failed = set()
+        self.follow_ups = follow_ups or {}
+        for unit in units:
+            self._add(unit)
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.done = threading.Event()
+
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind((host, port))
+        self.server.listen(16)
+        self.port = self.server.getsockname()[1]
+
+    def _add(self, unit):
+        self.units[unit["id"]] = unit
+        self.attempts[unit["id"]] = 0
+        self.pending.append(unit["id"])
+
+    def _release(self, unit_id):
+        """
+        Give a leased unit back to the queue, or fail it once it has used all its attempts.
+        """
+        self.leases.pop(unit_id, None)
+        if self.attempts[unit_id] >= self.max_attempts:
+            print(f"[FAILED] Unit {unit_id} after {self.attempts[unit_id]} attempts.")
+            self.failed.add(unit_id)
+            self._check_done()
+        else:
+            self.pending.append(unit_id)
+
+    def _fail(self, unit_id, address, error):
+        """
+        A worker could not run a unit: count it as a failed attempt and queue it again or give up on it.
+        """
+        with self.lock:
+            if unit_id in self.leases and self.leases[unit_id][0] == address:
+                print(f"[ERROR] Unit {unit_id} on {address}: {error}")
+                self._release(unit_id)
+
+    def _check_done(self):
+        if len(self.results) + len(self.failed) == len(self.units):
+            self.done.set()
+
+    def _lease(self, address):
+        with self.lock:
+            if not self.pending:
+                return {"type": "done"} if self.done.is_set() else {"type": "wait"}
+            unit_id = self.pending.popleft()
+            self.attempts[unit_id] += 1
+            self.leases[unit_id] = (address, time.monotonic() + self.lease_timeout)
+            return {"type": "unit", **self.units[unit_id]}
+
+    def _complete(self, unit_id, result):
+        with self.lock:
+            # A late answer for a unit that was already re-leased and finished elsewhere is ignored
+            if unit_id not in self.units or unit_id in self.results:
+                return
+            # A unit that used up its attempts still takes a late answer, e.g. from a slow worker
+            self.failed.discard(unit_id)
+            self.leases.pop(unit_id, None)
+            if unit_id in self.pending:
+                self.pending.remove(unit_id)
+            self.results[unit_id] = result
+            follow_up = self.follow_ups.get(self.units[unit_id]["kind"])
+            if follow_up is not None:
+                self._add(follow_up(unit_id, result))
+            self._check_done()
+
+    def _reap(self):
+        while not self.done.is_set():
+            time.sleep(min(self.lease_timeout / 4, 1.0))
+            now = time.monotonic()
+            with self.lock:
+                for unit_id in [unit_id for unit_id, (_, deadline) in self.leases.items() if deadline < now]:
+                    print(f"[EXPIRED] Lease of unit {unit_id} timed out.")
+                    self._release(unit_id)
+
+    def _handle_worker(self, worker_socket, address):
+        reader = worker_socket.makefile("r", encoding="utf-8")
+        try:
+            for line in reader:
+                message = json.loads(line)
+                if message["type"] == "result":
+                    self._complete(message["id"], message["result"])
+                    reply = self._lease(address)
+                elif message["type"] == "error":
+                    self._fail(message["id"], address, message.get("error"))
+                    reply = self._lease(address)
+                elif message["type"] == "request":
+                    reply = self._lease(address)
+                else:
+                    reply = {"type": "error", "error": f"Unknown message type: {message['type']}"}
+                worker_socket.sendall((json.dumps(reply) + "\n").encode("utf-8"))
+                if reply["type"] == "done":
+                    break
+        except (ConnectionResetError, BrokenPipeError, json.JSONDecodeError):
+            pass
+        finally:
+            # Anything this worker still holds goes back to the queue right away
+            with self.lock:
+                for unit_id in [unit_id for unit_id, (holder, _) in self.leases.items() if holder == address]:
+                    self._release(unit_id)
+            worker_socket.close()
+
+    def _accept(self):
+        while not self.done.is_set():
+            try:
+                worker_socket, address = self.server.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._handle_worker, args=(worker_socket, address), daemon=True).start()
+
+    def run(self, timeout=None):
+        """
+        Serve workers until every unit has a result or has failed. Returns {unit id: result}.
+        """
+        if not self.units:
+            return {}
+        threading.Thread(target=self._accept, daemon=True).start()
+        threading.Thread(target=self._reap, daemon=True).start()
+        self.done.wait(timeout)
+        # Let connected workers pick up their "done" reply before the socket closes
+        time.sleep(0.2)
+        self.server.close()
+        return self.results
+
+
+def run_worker(host="127.0.0.1", port=PORT, poll_interval=0.2):
+    """
+    Headless engine worker: request units, run them, send the results back until the coordinator is done.
+    """
+    worker_socket = socket.create_connection((host, port))
+    reader = worker_socket.makefile("r", encoding="utf-8")
+    message = {"type": "request"}
+    try:
+        while True:
+            worker_socket.sendall((json.dumps(message) + "\n").encode("utf-8"))
+            line = reader.readline()
+            if not line:
+                break
+            reply = json.loads(line)
+            if reply["type"] == "unit":
+                try:
+                    result = UNIT_KINDS[reply["kind"]](reply["payload"])
+                    message = {"type": "result", "id": reply["id"], "result": result}
+                except Exception as exception:
+                    # A bad unit must not take the worker down with it; the coordinator decides whether to retry
+                    message = {"type": "error", "id": reply["id"], "error": repr(exception)}
+            elif reply["type"] == "wait":
+                time.sleep(poll_interval)
+                message = {"type": "request"}
+            else:
+                break
+    except (ConnectionResetError, BrokenPipeError):
+        pass
+    finally:
+        worker_socket.close()
+
+
+def selfplay_units(games, depth=2, seed=0):
+    return [{"id": f"selfplay-{i}", "kind": "selfplay", "payload": {"seed": seed + i, "depth": depth}} for i in range(games)]
+
+
+def build_book(results, archive_dir=position_index.ARCHIVE_DIR):
+    """
+    Archive self-play results as journals and add them to the position index.
+    Games whose "index" unit came back are inserted as the worker replayed them; only the others are replayed here.
+    """
+    os.makedirs(archive_dir, exist_ok=True)
+    indexed = {result["game"]: result for result in results.values() if "entries" in result}
+    with position_index.PositionIndex() as index:
+        for unit_id, result in results.items():
+            if "moves" not in result:
+                continue
+            path = os.path.join(archive_dir, f"{unit_id}.acpj")
+            write_selfplay_journal(result["moves"], result["winner"], path)
+            if unit_id in indexed:
+                index.add_entries(path, indexed[unit_id]["winner"], indexed[unit_id]["entries"])
+            else:
+                index.add_game(path)
+
+
+def run_local(units, workers):
+    """
+    Run a coordinator and local worker processes on this machine. Returns (results, seconds).
+    """
+    coordinator = Coordinator(units, host="127.0.0.1", port=0)
+    processes = [Process(target=run_worker, args=("127.0.0.1", coordinator.port), daemon=True) for _ in range(workers)]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+    results = coordinator.run()
+    elapsed = time.perf_counter() - start
+    for process in processes:
+        process.join(timeout=5)
+    return results, elapsed
+
+
+def scaling_report(worker_counts=(1, 2, 4), games=16, depth=2):
+    """
+    Run the same self-play job with more and more local workers and print the throughput.
+    """
+    baseline = None
+    for workers in worker_counts:
+        results, elapsed = run_local(selfplay_units(games, depth), workers)
+        throughput = len(results) / elapsed
+        baseline = baseline or throughput
+        print(f"{workers:>2} workers: {len(results)} units in {elapsed:.2f}s, {throughput:.2f} units/s ({throughput / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    # python distributed.py coordinator [games] | worker [host] | scaling
+    command = sys.argv[1] if len(sys.argv) > 1 else "scaling"
+    if command == "coordinator":
+        coordinator = Coordinator(
+            selfplay_units(int(sys.argv[2]) if len(sys.argv) > 2 else 100),
+            follow_ups={"selfplay": index_follow_up},
+        )
+        print(f"[STARTING] Coordinator listening on port {coordinator.port}...")
+        build_book(coordinator.run())
+    elif command == "worker":
+        run_worker(sys.argv[2] if len(sys.argv) > 2 else "127.0.0.1")
+    else:
+        scaling_report()
@@ -0,0 +1,374 @@
+import mmap
+import os
+import struct
+from typing import Dict, Iterator, Optional, Tuple
+
+from logic import COLORS, PIECE_TYPES, coord_to_index, index_to_coord, apply_move, promote
+
+# File layout: a fixed header, a mode record, then append-only records.
+# The header holds the offset of the latest snapshot, so a restore only
+# replays the records written after it.
+MAGIC = b"ACPJ"
+VERSION = 1
+HEADER = struct.Struct("<4sBxxxQ")
+
+MOVE = b"M"
+PROMOTION = b"P"
+CLOCK = b"C"
+SNAPSHOT = b"S"
+END = b"E"
+MODE = b"G"
+
+MOVE_RECORD = struct.Struct("<cBBBB")       # color, piece, from, to
+PROMOTION_RECORD = struct.Struct("<cBB")    # square, piece
+CLOCK_RECORD = struct.Struct("<cII")        # white seconds, black seconds
+SNAPSHOT_RECORD = struct.Struct("<cIBB")    # ply, player, piece count
+SNAPSHOT_PIECE = struct.Struct("<BB")       # color << 4 | piece, square
+END_RECORD = struct.Struct("<cB")           # winner (0 white, 1 black, 2 none)
+MODE_RECORD = struct.Struct("<cB")          # 1 if singleplayer: the side to move never changes
+
+# Sizes of the fixed-size records by kind byte, for scanning without decoding
+FIXED_SIZES = {
+    MOVE[0]: MOVE_RECORD.size,
+    PROMOTION[0]: PROMOTION_RECORD.size,
+    CLOCK[0]: CLOCK_RECORD.size,
+    END[0]: END_RECORD.size,
+    MODE[0]: MODE_RECORD.size,
+}
+
+SNAPSHOT_INTERVAL = 32
+FSYNC_BATCH = 8
+
+class JournalError(Exception):
+    pass
+
+class JournalWriter:
+    def __init__(self, path: str, singleplayer: bool = False, snapshot_interval: int = SNAPSHOT_INTERVAL, fsync_batch: int = FSYNC_BATCH):
+        self.path = path
+        self.snapshot_interval = snapshot_interval
+        self.fsync_batch = fsync_batch
+        self.ply = 0
+        self.pending = 0
+        self.moves_since_snapshot = 0
+        self.last_clock = None
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, 0))
+        self.file.write(MODE_RECORD.pack(MODE, int(singleplayer)))
+        self.sync()
+
+    @classmethod
+    def resume(cls, path: str, ply: int, snapshot_interval: int = SNAPSHOT_INTERVAL, fsync_batch: int = FSYNC_BATCH):
+        """
+        Reopen an existing journal and keep appending to it.
+        """
+        writer = cls.__new__(cls)
+        writer.path = path
+        writer.snapshot_interval = snapshot_interval
+        writer.fsync_batch = fsync_batch
+        writer.ply = ply
+        writer.pending = 0
+        writer.moves_since_snapshot = 0
+        writer.last_clock = None
+        writer.file = open(path, "r+b")
+        writer.file.truncate(_valid_length(path))
+        writer.file.seek(0, os.SEEK_END)
+        return writer
+
+    def _append(self, data: bytes):
+        self.file.write(data)
+        self.pending += 1
+        if self.pending >= self.fsync_batch:
+            self.sync()
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+
+    def record_move(self, piece_color: str, piece_type: str, from_coord: str, to_coord: str):
+        self._append(MOVE_RECORD.pack(
+            MOVE, COLORS.index(piece_color), PIECE_TYPES.index(piece_type),
+            coord_to_index(from_coord), coord_to_index(to_coord),
+        ))
+        self.ply += 1
+        self.moves_since_snapshot += 1
+
+    def record_promotion(self, chess_coord: str, promoted_piece: str):
+        self._append(PROMOTION_RECORD.pack(PROMOTION, coord_to_index(chess_coord), PIECE_TYPES.index(promoted_piece)))
+
+    def record_clock(self, white_time_left: int, black_time_left: int):
+        self.last_clock = (max(white_time_left, 0), max(black_time_left, 0))
+        self._append(CLOCK_RECORD.pack(CLOCK, *self.last_clock))
+
+    def record_end(self, winner: Optional[str]):
+        winner_index = COLORS.index(winner.lower()) if winner else 2
+        self._append(END_RECORD.pack(END, winner_index))
+        self.sync()
+
+    def snapshot_due(self) -> bool:
+        return self.moves_since_snapshot >= self.snapshot_interval
+
+    def record_snapshot(self, positions: Dict[str, Dict[str, list]], player: str):
+        """
+        Write the full position, then point the header at it once it is on disk.
+        """
+        pieces = [
+            SNAPSHOT_PIECE.pack(COLORS.index(color) << 4 | PIECE_TYPES.index(piece), coord_to_index(coord))
+            for color, pieces_dict in positions.items()
+            for piece, coords in pieces_dict.items()
+            for coord in coords
+        ]
+        offset = self.file.tell()
+        self.file.write(SNAPSHOT_RECORD.pack(SNAPSHOT, self.ply, COLORS.index(player), len(pieces)))
+        self.file.write(b"".join(pieces))
+        self.sync()
+
+        # A crash before this point leaves the header on the previous snapshot, which is still valid
+        self.file.seek(0)
+        self.file.write(HEADER.pack(MAGIC, VERSION, offset))
+        self.sync()
+        self.file.seek(0, os.SEEK_END)
+        self.moves_since_snapshot = 0
+
+        # Restores start from the snapshot, so carry the clocks over
+        if self.last_clock:
+            self._append(CLOCK_RECORD.pack(CLOCK, *self.last_clock))
+
+    def close(self):
+        if not self.file.closed:
+            self.sync()
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _record_size(data, offset: int) -> int:
+    """
+    Size of the record starting at offset, or 0 if it is truncated or unknown.
+    """
+    remaining = len(data) - offset
+    kind = data[offset:offset + 1]
+    if kind == MOVE:
+        size = MOVE_RECORD.size
+    elif kind == PROMOTION:
+        size = PROMOTION_RECORD.size
+    elif kind == CLOCK:
+        size = CLOCK_RECORD.size
+    elif kind == END:
+        size = END_RECORD.size
+    elif kind == MODE:
+        size = MODE_RECORD.size
+    elif kind == SNAPSHOT:
+        if remaining < SNAPSHOT_RECORD.size:
+            return 0
+        count = SNAPSHOT_RECORD.unpack_from(data, offset)[3]
+        size = SNAPSHOT_RECORD.size + count * SNAPSHOT_PIECE.size
+    else:
+        return 0
+    return size if size <= remaining else 0
+
+def _valid_length(path: str) -> int:
+    """
+    Length of the journal up to the last complete record (a crash may leave a torn tail).
+    """
+    with JournalReader(path) as reader:
+        offset = HEADER.size
+        while offset < len(reader.data):
+            size = _record_size(reader.data, offset)
+            if not size:
+                break
+            offset += size
+        return offset
+
+class JournalReader:
+    """
+    Memory-mapped reader; records are decoded straight from the mapping without copying the file.
+    """
+    def __init__(self, path: str):
+        self.file = open(path, "rb")
+        if os.fstat(self.file.fileno()).st_size < HEADER.size + MODE_RECORD.size:
+            self.file.close()
+            raise JournalError(f"Journal too short: {path}")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.snapshot_offset = HEADER.unpack_from(self.data, 0)
+        kind, singleplayer = MODE_RECORD.unpack_from(self.data, HEADER.size)
+        if magic != MAGIC or version != VERSION or kind != MODE:
+            self.close()
+            raise JournalError(f"Not a game journal: {path}")
+        self.singleplayer = bool(singleplayer)
+
+    def records(self, offset: int = HEADER.size) -> Iterator[Tuple]:
+        """
+        Yield decoded records from offset until the end of the file or a torn tail.
+        """
+        data = self.data
+        end = len(data)
+        while offset < end:
+            kind = data[offset:offset + 1]
+            if kind == MOVE and offset + MOVE_RECORD.size <= end:
+                _, color, piece, from_square, to_square = MOVE_RECORD.unpack_from(data, offset)
+                yield MOVE, COLORS[color], PIECE_TYPES[piece], index_to_coord(from_square), index_to_coord(to_square)
+                offset += MOVE_RECORD.size
+            elif kind == PROMOTION and offset + PROMOTION_RECORD.size <= end:
+                _, square, piece = PROMOTION_RECORD.unpack_from(data, offset)
+                yield PROMOTION, index_to_coord(square), PIECE_TYPES[piece]
+                offset += PROMOTION_RECORD.size
+            elif kind == CLOCK and offset + CLOCK_RECORD.size <= end:
+                _, white_time_left, black_time_left = CLOCK_RECORD.unpack_from(data, offset)
+                yield CLOCK, white_time_left, black_time_left
+                offset += CLOCK_RECORD.size
+            elif kind == END and offset + END_RECORD.size <= end:
+                _, winner = END_RECORD.unpack_from(data, offset)
+                yield END, COLORS[winner] if winner < 2 else None
+                offset += END_RECORD.size
+            elif kind == MODE and offset + MODE_RECORD.size <= end:
+                yield MODE, bool(MODE_RECORD.unpack_from(data, offset)[1])
+                offset += MODE_RECORD.size
+            elif kind == SNAPSHOT and _record_size(data, offset):
+                _, ply, player, count = SNAPSHOT_RECORD.unpack_from(data, offset)
+                offset += SNAPSHOT_RECORD.size
+                positions = {color: {piece: [] for piece in PIECE_TYPES} for color in COLORS}
+                for _ in range(count):
+                    packed, square = SNAPSHOT_PIECE.unpack_from(data, offset)
+                    positions[COLORS[packed >> 4]][PIECE_TYPES[packed & 0xF]].append(index_to_coord(square))
+                    offset += SNAPSHOT_PIECE.size
+                yield SNAPSHOT, ply, COLORS[player], positions
+            else:
+                break
+
+    def raw_moves(self) -> Iterator[Tuple[int, int, int, int, int]]:
+        """
+        Fast path for bulk replay: yield (color, piece, from square, to square, promotion piece or -1)
+        as plain indices, unpacked straight from the mapping. Other records are skipped by size.
+        """
+        data = self.data
+        end = len(data)
+        offset = HEADER.size
+        unpack_move = MOVE_RECORD.unpack_from
+        move_kind, promotion_kind, snapshot_kind = MOVE[0], PROMOTION[0], SNAPSHOT[0]
+        move_size, promotion_size = MOVE_RECORD.size, PROMOTION_RECORD.size
+        pending = None
+        while offset < end:
+            kind = data[offset]
+            if kind == move_kind:
+                if offset + move_size > end:
+                    break
+                if pending is not None:
+                    yield pending + (-1,)
+                pending = unpack_move(data, offset)[1:]
+                offset += move_size
+            elif kind == promotion_kind:
+                if offset + promotion_size > end:
+                    break
+                if pending is not None:
+                    yield pending + (data[offset + 2],)
+                    pending = None
+                offset += promotion_size
+            else:
+                size = _record_size(data, offset) if kind == snapshot_kind else FIXED_SIZES.get(kind, 0)
+                if not size or offset + size > end:
+                    break
+                offset += size
+        if pending is not None:
+            yield pending + (-1,)
+
+    def close(self):
+        if hasattr(self, "data"):
+            self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def restore(path: str) -> Optional[dict]:
+    """
+    Rebuild the game stored in a journal from its latest snapshot.
+    Returns None if there is no journal or it holds no snapshot yet.
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        reader = JournalReader(path)
+    except JournalError:
+        return None
+
+    with reader:
+        if not reader.snapshot_offset:
+            return None
+        state = None
+        for record in reader.records(reader.snapshot_offset):
+            kind = record[0]
+            if kind == SNAPSHOT:
+                _, ply, player, positions = record
+                state = {
+                    "positions": positions, "player": player, "ply": ply,
+                    "singleplayer": reader.singleplayer,
+                    "white_time_left": None, "black_time_left": None,
+                    "finished": False, "winner": None,
+                }
+                last_mover = None
+            elif kind == MOVE:
+                _, last_mover, piece_type, from_coord, to_coord = record
+                apply_move(state["positions"], last_mover, piece_type, from_coord, to_coord)
+                if not reader.singleplayer:
+                    state["player"] = "black" if last_mover == "white" else "white"
+                state["ply"] += 1
+            elif kind == PROMOTION and last_mover:
+                _, chess_coord, promoted_piece = record
+                promote(state["positions"], last_mover, chess_coord, promoted_piece)
+            elif kind == CLOCK:
+                _, state["white_time_left"], state["black_time_left"] = record
+            elif kind == END:
+                state["finished"], state["winner"] = True, record[1]
+        return state
+
+def replay(path: str) -> Iterator[Tuple[str, str, str, str, Optional[str]]]:
+    """
+    Yield (color, piece, from, to, promotion) for every move in a journal.
+    """
+    with JournalReader(path) as reader:
+        last_move = None
+        for record in reader.records():
+            kind = record[0]
+            if kind == MOVE:
+                if last_move:
+                    yield last_move + (None,)
+                last_move = record[1:]
+            elif kind == PROMOTION and last_move:
+                yield last_move + (record[2],)
+                last_move = None
+        if last_move:
+            yield last_move + (None,)
+
+def replay_raw(path: str) -> Iterator[Tuple[int, int, int, int, int]]:
+    """
+    Lazily yield the moves of a journal as indices, see JournalReader.raw_moves.
+    """
+    with JournalReader(path) as reader:
+        yield from reader.raw_moves()
+
+def replay_archive(directory: str) -> Iterator[Tuple[str, Iterator[Tuple[int, int, int, int, int]]]]:
+    """
+    Yield (game path, lazy move iterator) for every journal in an archive directory.
+    Moves are (color, piece, from square, to square, promotion piece or -1) indices; unreadable journals yield no moves.
+    """
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".acpj"):
+            path = os.path.join(directory, name)
+            yield path, _replay_or_skip(path)
+
+def _replay_or_skip(path: str) -> Iterator[Tuple[int, int, int, int, int]]:
+    try:
+        yield from replay_raw(path)
+    except JournalError:
+        return
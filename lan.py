@@ -1,28 +1,282 @@
+import os
+import json
+import math
+import time
 import socket
 import threading
+from collections import OrderedDict, deque
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import ai
+import logic
 
 status = None
 
+ENGINE_WORKERS = max((os.cpu_count() or 2) - 1, 1)
+MAX_DEPTH = 3
+GAME_TIME_BUDGET = 300.0  # Seconds of engine thinking for a whole game
+MOVES_TO_GO = 30  # The remaining budget is spread over this many moves
+MIN_MOVE_TIME = 0.05
+REQUEST_TIMEOUT = 120.0  # A client never waits longer than this for an engine move
+MAX_GAMES = 1024  # Budgets of the least recently active games are dropped beyond this
+
+
+def engine_search(board, color, depth, time_budget):
+    """
+    Runs in an engine worker process. Returns (move, depth reached, seconds spent).
+    """
+    start = time.monotonic()
+    move, depth_reached = ai.timed_move(board, color, depth, time_budget)
+    # Packed moves stay inside the engine, the network gets 'e2e4'
+    return (logic.move_to_string(move) if move is not None else None), depth_reached, time.monotonic() - start
+
+
+def validate_board(board):
+    """
+    Return an error message if board is not a positions dict the engine can search, else None.
+    """
+    if not isinstance(board, dict) or not set(board) <= set(logic.COLORS):
+        return "board must map 'white'/'black' to pieces"
+    occupied = set()
+    for color, pieces in board.items():
+        if not isinstance(pieces, dict) or not set(pieces) <= set(logic.PIECE_TYPES):
+            return f"unknown piece type for {color}"
+        for piece, coords in pieces.items():
+            if not isinstance(coords, list):
+                return f"{color} {piece} must be a list of squares"
+            for coord in coords:
+                if not isinstance(coord, str) or len(coord) != 2 or coord[0] not in "abcdefgh" or coord[1] not in "12345678":
+                    return f"invalid square {coord!r}"
+                if coord in occupied:
+                    return f"square {coord} is occupied twice"
+                if piece == "pawn" and coord[1] in "18":
+                    return f"pawn on last row at {coord}"
+                occupied.add(coord)
+    return None
+
+
+class EnginePool:
+    """
+    Bounded pool of engine processes shared by every room on the server.
+    Requests are queued per game and dispatched round-robin, so one busy room can't starve the others.
+    When the backlog grows, the search depth is lowered instead of letting every room wait.
+    """
+    def __init__(self, workers=ENGINE_WORKERS, max_depth=MAX_DEPTH):
+        self.workers = workers
+        self.max_depth = max_depth
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.queues = OrderedDict()  # game id -> deque of pending requests, only while it has some
+        self.budgets = OrderedDict()  # game id -> seconds of engine time left for the game, least recent first
+        self.condition = threading.Condition()
+        self.in_flight = 0
+        self.completed = 0
+        self.latencies = deque(maxlen=1000)
+        self.running = True
+        threading.Thread(target=self._dispatch, daemon=True).start()
+
+    def submit(self, game_id, board, color, game_budget=GAME_TIME_BUDGET):
+        """
+        Queue an AI move for a game; the returned Future resolves to {"move", "depth", "latency", "budget_left"}.
+        game_budget is the game's total engine time, used the first time the game is seen.
+        """
+        future = Future()
+        with self.condition:
+            self.budgets.setdefault(game_id, game_budget)
+            self.budgets.move_to_end(game_id)
+            if len(self.budgets) > MAX_GAMES:
+                self.budgets.popitem(last=False)
+            self.queues.setdefault(game_id, deque()).append((board, color, time.monotonic(), future))
+            self.condition.notify()
+        return future
+
+    def move_time(self, game_id):
+        """
+        Share of the game's remaining budget for its next move.
+        """
+        return max(self.budgets.get(game_id, 0.0) / MOVES_TO_GO, MIN_MOVE_TIME)
+
+    def queue_depth(self):
+        return sum(len(queue) for queue in self.queues.values())
+
+    def search_depth(self):
+        """
+        Full depth while every request can get a worker, one ply less per extra round of backlog.
+        """
+        backlog = (self.queue_depth() + self.in_flight) // self.workers
+        return max(1, self.max_depth - backlog)
+
+    def _next_request(self):
+        # Round-robin: take the first game with work and move it to the back; games without work are dropped
+        for game_id, queue in self.queues.items():
+            request = queue.popleft()
+            if queue:
+                self.queues.move_to_end(game_id)
+            else:
+                del self.queues[game_id]
+            return (game_id,) + request
+        return None
+
+    def _dispatch(self):
+        while self.running:
+            with self.condition:
+                while self.running and (self.in_flight >= self.workers or not self.queue_depth()):
+                    self.condition.wait()
+                if not self.running:
+                    break
+                game_id, board, color, queued_at, future = self._next_request()
+                # Depth is chosen once the request has left the queue, so it doesn't count as its own backlog
+                depth = self.search_depth()
+                time_budget = self.move_time(game_id)
+                self.in_flight += 1
+                executor = self.executor
+            try:
+                job = executor.submit(engine_search, board, color, depth, time_budget)
+            except (BrokenProcessPool, RuntimeError) as exception:
+                # An engine process died: fail this request and start a fresh pool for the next ones
+                with self.condition:
+                    self.in_flight -= 1
+                    self.condition.notify()
+                self._replace_executor(executor)
+                future.set_exception(exception)
+                continue
+            job.add_done_callback(
+                lambda job, executor=executor, game_id=game_id, queued_at=queued_at, future=future:
+                    self._finish(job, executor, game_id, queued_at, future)
+            )
+
+    def _replace_executor(self, broken):
+        """
+        Swap a broken process pool for a new one, unless that already happened.
+        """
+        with self.condition:
+            if self.executor is not broken or not self.running:
+                return
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _finish(self, job, executor, game_id, queued_at, future):
+        latency = time.monotonic() - queued_at
+        try:
+            exception = job.exception()
+        except CancelledError as cancelled:  # shutdown(cancel_futures=True)
+            exception = cancelled
+        with self.condition:
+            self.in_flight -= 1
+            self.completed += 1
+            self.latencies.append(latency)
+            if exception is None:
+                move, depth, spent = job.result()
+                if game_id in self.budgets:
+                    self.budgets[game_id] = max(self.budgets[game_id] - spent, 0.0)
+            self.condition.notify()
+        if isinstance(exception, BrokenProcessPool):
+            self._replace_executor(executor)
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result({"move": move, "depth": depth, "latency": latency, "budget_left": self.budgets.get(game_id, 0.0)})
+
+    def forget(self, prefix):
+        """
+        Drop the pending requests of every game whose id starts with prefix, e.g. a disconnected client.
+        """
+        with self.condition:
+            for game_id in [game_id for game_id in self.queues if game_id.startswith(prefix)]:
+                del self.queues[game_id]
+            for game_id in [game_id for game_id in self.budgets if game_id.startswith(prefix)]:
+                del self.budgets[game_id]
+
+    def metrics(self):
+        with self.condition:
+            latencies = sorted(self.latencies)
+            return {
+                "workers": self.workers,
+                "queue_depth": self.queue_depth(),
+                "in_flight": self.in_flight,
+                "completed": self.completed,
+                "search_depth": self.search_depth(),
+                "games": len(self.queues),
+                "latency_avg": sum(latencies) / len(latencies) if latencies else 0.0,
+                "latency_p95": latencies[int(len(latencies) * 0.95)] if latencies else 0.0,
+            }
+
+    def shutdown(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        self.executor.shutdown(cancel_futures=True)
+
+
+engine_pool = None
+
+
+def handle_message(message, address):
+    """
+    Messages are JSON lines: {"type": "ai_move", "game": ..., "board": ..., "color": ..., "time_budget": ...}
+    or {"type": "metrics"}. time_budget is the engine time for the whole game, in seconds.
+    Anything else is treated as a plain move notification.
+    """
+    try:
+        request = json.loads(message)
+    except json.JSONDecodeError:
+        request = None
+    if not isinstance(request, dict):
+        return "Move received."
+
+    if request.get("type") == "metrics":
+        return json.dumps(engine_pool.metrics())
+    if request.get("type") == "ai_move":
+        error = validate_board(request.get("board"))
+        color = request.get("color", "black")
+        game_budget = request.get("time_budget", GAME_TIME_BUDGET)
+        if error is None and color not in logic.COLORS:
+            error = f"invalid color {color!r}"
+        # bool is an int subclass, so 'true' would otherwise pass as one second; JSON also allows NaN and Infinity
+        if error is None and (
+            isinstance(game_budget, bool) or not isinstance(game_budget, (int, float))
+            or not math.isfinite(game_budget) or game_budget <= 0
+        ):
+            error = "time_budget must be a positive number of seconds"
+        if error is not None:
+            return json.dumps({"error": error})
+
+        game_id = f"{address}-{request.get('game', 0)}"
+        future = engine_pool.submit(game_id, request["board"], color, game_budget)
+        try:
+            return json.dumps(future.result(timeout=REQUEST_TIMEOUT))
+        except TimeoutError:
+            return json.dumps({"error": "Engine timed out"})
+        except Exception as exception:
+            return json.dumps({"error": f"Engine failed: {exception!r}"})
+    return json.dumps({"error": f"Unknown request type: {request.get('type')}"})
+
 
 def handle_client(client_socket, address):
     print(f"[NEW CONNECTION] {address} connected.")
-    while True:
-        try:
-            message = client_socket.recv(1024).decode('utf-8')
+    reader = client_socket.makefile("r", encoding="utf-8")
+    try:
+        while True:
+            message = reader.readline()
             if not message:
                 break
+            message = message.strip()
             print(f"[{address}] {message}")
-            client_socket.send("Move received.".encode('utf-8'))
-        except ConnectionResetError:
-            break
-    print(f"[DISCONNECTED] {address} disconnected.")
-    client_socket.close()
+            client_socket.sendall(f"{handle_message(message, address)}\n".encode('utf-8'))
+    except (ConnectionResetError, BrokenPipeError, UnicodeDecodeError):
+        pass
+    finally:
+        print(f"[DISCONNECTED] {address} disconnected.")
+        engine_pool.forget(f"{address}-")
+        client_socket.close()
 
 def start_server():
+    global engine_pool
+    engine_pool = EnginePool()
     server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server.bind(("0.0.0.0", 5555))
     server.listen(5)
-    print("[STARTING] Server is starting...")
+    print(f"[STARTING] Server is starting with {engine_pool.workers} engine workers...")
     while True:
         client_socket, address = server.accept()
         thread = threading.Thread(target=handle_client, args=(client_socket, address))
@@ -1,5 +1,147 @@
+import random
 from typing import Dict
 
+COLORS = ("white", "black")
+PIECE_TYPES = ("pawn", "knight", "bishop", "rook", "queen", "king")
+
+INITIAL_POSITIONS = {
+    "white": {
+        "rook": ["a1", "h1"],
+        "knight": ["b1", "g1"],
+        "bishop": ["c1", "f1"],
+        "queen": ["d1"],
+        "king": ["e1"],
+        "pawn": [f"{chr(col)}2" for col in range(ord("a"), ord("h") + 1)],
+    },
+    "black": {
+        "rook": ["a8", "h8"],
+        "knight": ["b8", "g8"],
+        "bishop": ["c8", "f8"],
+        "queen": ["d8"],
+        "king": ["e8"],
+        "pawn": [f"{chr(col)}7" for col in range(ord("a"), ord("h") + 1)],
+    },
+}
+
+# Zobrist keys, one per (color, piece, square) plus the side to move.
+# 63-bit so hashes fit in a signed SQLite INTEGER.
+_zobrist_random = random.Random(0x5EED)
+ZOBRIST_PIECES = {
+    (color, piece): [_zobrist_random.getrandbits(63) for _ in range(64)]
+    for color in COLORS
+    for piece in PIECE_TYPES
+}
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(63)
+
+# Packed moves: from square (6 bits) | to square (6 bits) | promotion piece (2 bits) | flags (2 bits).
+# The promotion bits index PROMOTION_PIECES and are only meaningful with PROMOTION_FLAG set;
+# every promotion, including underpromotions, is a separate move.
+# The engine works on these and on a 64-square mailbox; coordinates like 'e4' are only used by the GUI and network code.
+PROMOTION_PIECES = ("knight", "bishop", "rook", "queen")
+CAPTURE_FLAG = 1 << 14
+PROMOTION_FLAG = 1 << 15
+# Mailbox code of the promoted piece minus the pawn's code, by promotion bits
+PROMOTION_OFFSETS = tuple(PIECE_TYPES.index(piece) for piece in PROMOTION_PIECES)
+# Promotion bits and flag of each promotion, queen first so it is searched first
+PROMOTIONS = tuple(PROMOTION_FLAG | index << 12 for index in reversed(range(len(PROMOTION_PIECES))))
+
+# Mailbox square contents: 0 for empty, otherwise 1 + color * 6 + piece type
+EMPTY = 0
+# Zobrist keys by mailbox code
+ZOBRIST_BY_CODE = [None] + [ZOBRIST_PIECES[(color, piece)] for color in COLORS for piece in PIECE_TYPES]
+
+def _targets(square: int, offsets) -> tuple:
+    col, row = square % 8, square // 8
+    return tuple(
+        (row + dy) * 8 + col + dx
+        for dx, dy in offsets
+        if 0 <= col + dx < 8 and 0 <= row + dy < 8
+    )
+
+def _ray(square: int, dx: int, dy: int) -> tuple:
+    col, row = square % 8 + dx, square // 8 + dy
+    ray = []
+    while 0 <= col < 8 and 0 <= row < 8:
+        ray.append(row * 8 + col)
+        col, row = col + dx, row + dy
+    return tuple(ray)
+
+KNIGHT_TARGETS = [_targets(square, [(2, 1), (2, -1), (-2, 1), (-2, -1), (1, 2), (1, -2), (-1, 2), (-1, -2)]) for square in range(64)]
+KING_TARGETS = [_targets(square, [(1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (-1, 1), (1, -1), (-1, -1)]) for square in range(64)]
+ROOK_RAYS = [[_ray(square, dx, dy) for dx, dy in [(1, 0), (-1, 0), (0, 1), (0, -1)]] for square in range(64)]
+BISHOP_RAYS = [[_ray(square, dx, dy) for dx, dy in [(1, 1), (-1, 1), (1, -1), (-1, -1)]] for square in range(64)]
+QUEEN_RAYS = [ROOK_RAYS[square] + BISHOP_RAYS[square] for square in range(64)]
+
+def coord_to_index(coordinate: str) -> int:
+    """
+    Convert a chess coordinate (e.g., 'e4') into a square index 0-63 (a1 = 0, h8 = 63).
+    """
+    return (int(coordinate[1]) - 1) * 8 + ord(coordinate[0]) - ord("a")
+
+def index_to_coord(index: int) -> str:
+    """
+    Convert a square index 0-63 back into a chess coordinate.
+    """
+    return f"{chr(ord('a') + index % 8)}{index // 8 + 1}"
+
+def piece_code(color: str, piece: str) -> int:
+    return 1 + COLORS.index(color) * 6 + PIECE_TYPES.index(piece)
+
+def squares_from_positions(positions: Dict[str, Dict[str, list]]) -> list:
+    """
+    Convert a positions dict into a 64-square mailbox of piece codes.
+    """
+    squares = [EMPTY] * 64
+    for color, pieces in positions.items():
+        for piece, coords in pieces.items():
+            code = piece_code(color, piece)
+            for coord in coords:
+                squares[coord_to_index(coord)] = code
+    return squares
+
+def move_to_coords(move: int) -> tuple:
+    return index_to_coord(move & 63), index_to_coord((move >> 6) & 63)
+
+def move_to_string(move: int) -> str:
+    """
+    Format a packed move as 'e2e4', or 'e7e8q' for a promotion.
+    """
+    from_coord, to_coord = move_to_coords(move)
+    if move & PROMOTION_FLAG:
+        return f"{from_coord}{to_coord}{'nbrq'[(move >> 12) & 3]}"
+    return f"{from_coord}{to_coord}"
+
+def zobrist_hash(positions: Dict[str, Dict[str, list]], player: str) -> int:
+    """
+    Hash a position together with the side to move.
+    """
+    key = ZOBRIST_BLACK_TO_MOVE if player == "black" else 0
+    for color, pieces in positions.items():
+        for piece, coords in pieces.items():
+            keys = ZOBRIST_PIECES[(color, piece)]
+            for coord in coords:
+                key ^= keys[coord_to_index(coord)]
+    return key
+
+def apply_move(positions: Dict[str, Dict[str, list]], piece_color: str, piece_type: str, from_coord: str, to_coord: str):
+    """
+    Move a piece in place and remove any enemy piece standing on the destination square.
+    """
+    positions[piece_color][piece_type].remove(from_coord)
+    positions[piece_color][piece_type].append(to_coord)
+    for enemy_color in positions:
+        if enemy_color != piece_color:
+            for enemy_positions in positions[enemy_color].values():
+                if to_coord in enemy_positions:
+                    enemy_positions.remove(to_coord)
+
+def promote(positions: Dict[str, Dict[str, list]], piece_color: str, chess_coord: str, promoted_piece: str):
+    """
+    Replace the pawn on chess_coord with promoted_piece.
+    """
+    positions[piece_color]['pawn'].remove(chess_coord)
+    positions[piece_color].setdefault(promoted_piece, []).append(chess_coord)
+
 def decompose_coord(coordinate: str) -> list:
     """
     Decompose a chess coordinate (e.g., 'e4') into a list [column, row].
@@ -182,3 +324,69 @@ def movement_schema(chess_coord: str, piece_type: str, piece_color: str, positio
 
     return possible_moves
 
+
+def generate_packed_moves(squares: list, color_index: int, moves, start: int) -> int:
+    """
+    Write the packed moves of color_index into moves[start:] and return the end index.
+    Follows the same rules as movement_schema; a pawn reaching the last row gets one move per promotion piece.
+    """
+    end = start
+    first, last = 1 + color_index * 6, 6 + color_index * 6
+    for square in range(64):
+        code = squares[square]
+        if code < first or code > last:
+            continue
+        piece = code - first
+        if piece == 0:  # pawn
+            row = square >> 3
+            step, start_row, last_row, final_row = (8, 1, 6, 7) if color_index == 0 else (-8, 6, 1, 0)
+            if row == final_row:  # An unpromoted pawn on its final row, e.g. from a torn journal, has no moves
+                continue
+            promotes = row == last_row
+            forward = square + step
+            if squares[forward] == EMPTY:
+                if promotes:
+                    for promotion in PROMOTIONS:
+                        moves[end] = square | forward << 6 | promotion
+                        end += 1
+                else:
+                    moves[end] = square | forward << 6
+                    end += 1
+            if row == start_row and squares[forward + step] == EMPTY:
+                moves[end] = square | (forward + step) << 6
+                end += 1
+            col = square & 7
+            for capture_col, target in ((col - 1, forward - 1), (col + 1, forward + 1)):
+                if 0 <= capture_col < 8:
+                    target_code = squares[target]
+                    if target_code and (target_code < first or target_code > last):
+                        if promotes:
+                            for promotion in PROMOTIONS:
+                                moves[end] = square | target << 6 | CAPTURE_FLAG | promotion
+                                end += 1
+                        else:
+                            moves[end] = square | target << 6 | CAPTURE_FLAG
+                            end += 1
+        elif piece == 1 or piece == 5:  # knight, king
+            for target in (KNIGHT_TARGETS if piece == 1 else KING_TARGETS)[square]:
+                target_code = squares[target]
+                if target_code == EMPTY:
+                    moves[end] = square | target << 6
+                    end += 1
+                elif target_code < first or target_code > last:
+                    moves[end] = square | target << 6 | CAPTURE_FLAG
+                    end += 1
+        else:  # sliders
+            rays = BISHOP_RAYS if piece == 2 else ROOK_RAYS if piece == 3 else QUEEN_RAYS
+            for ray in rays[square]:
+                for target in ray:
+                    target_code = squares[target]
+                    if target_code == EMPTY:
+                        moves[end] = square | target << 6
+                        end += 1
+                    else:
+                        if target_code < first or target_code > last:
+                            moves[end] = square | target << 6 | CAPTURE_FLAG
+                            end += 1
+                        break
+    return end
@@ -1,11 +1,16 @@
 import pygame
 import sys
 import os
+import copy
 import time
+import uuid
 import logic
+import journal
+import position_index
 import logging
 import threading
 import ai
+from analysis import Analyzer
 from enum import Enum
 from typing import Dict, Tuple
 from screens import main_menu, game_over, promotion_choice
@@ -16,6 +21,8 @@ ROWS, COLS = 8, 8
 SQUARE_SIZE = WIDTH // COLS
 FPS = 10
 DEBUG = True
+JOURNAL_PATH = os.path.join("saves", "current_game.acpj")
+ARCHIVE_DIR = position_index.ARCHIVE_DIR
 
 class Colors(Enum):
     LIGHT = (224, 205, 169)
@@ -23,24 +30,7 @@ class Colors(Enum):
     HIGHLIGHT = (0, 0, 0)
 
 AI_COLOR = "black"
-INITIAL_POSITIONS = {
-    "white": {
-        "rook": ["a1", "h1"],
-        "knight": ["b1", "g1"],
-        "bishop": ["c1", "f1"],
-        "queen": ["d1"],
-        "king": ["e1"],
-        "pawn": [f"{chr(col)}2" for col in range(ord("a"), ord("h") + 1)],
-    },
-    "black": {
-        "rook": ["a8", "h8"],
-        "knight": ["b8", "g8"],
-        "bishop": ["c8", "f8"],
-        "queen": ["d8"],
-        "king": ["e8"],
-        "pawn": [f"{chr(col)}7" for col in range(ord("a"), ord("h") + 1)],
-    },
-}
+INITIAL_POSITIONS = logic.INITIAL_POSITIONS
 
 player = 'white'
 winner = None
@@ -138,6 +128,52 @@ def highlight_move(row: int, col: int):
     overlay.fill((105, 105, 105))
     screen.blit(overlay, (col * SQUARE_SIZE, row * SQUARE_SIZE))
 
+# Analysis overlay, rendered again only when a new analysis result arrives
+analysis_overlay = {"result": None, "surface": None}
+
+def square_center(coord: str) -> Tuple[int, int]:
+    row, col = chess_to_indices(coord)
+    return col * SQUARE_SIZE + SQUARE_SIZE // 2, row * SQUARE_SIZE + SQUARE_SIZE // 2
+
+def draw_arrow(surface: pygame.Surface, color: Tuple[int, int, int, int], start: Tuple[int, int], end: Tuple[int, int], width: int):
+    direction = pygame.math.Vector2(end) - pygame.math.Vector2(start)
+    if direction.length() == 0:
+        return
+    direction.scale_to_length(1)
+    normal = pygame.math.Vector2(-direction.y, direction.x)
+    head_base = pygame.math.Vector2(end) - direction * width * 2.5
+    pygame.draw.line(surface, color, start, head_base, width)
+    pygame.draw.polygon(surface, color, [end, head_base + normal * width * 1.5, head_base - normal * width * 1.5])
+
+def render_analysis(result) -> pygame.Surface:
+    surface = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
+    if not result["lines"]:
+        return surface
+
+    # Eval bar: white's expected score on the left edge
+    score = result["lines"][0][0]
+    white_share = 1 / (1 + 10 ** (-max(min(score, 40), -40) / 4))
+    white_height = int(HEIGHT * white_share)
+    pygame.draw.rect(surface, (20, 20, 20, 220), (0, 0, 12, HEIGHT - white_height))
+    pygame.draw.rect(surface, (245, 245, 245, 220), (0, HEIGHT - white_height, 12, white_height))
+
+    # Best-move arrows, strongest line drawn last and thickest
+    for rank, (line_score, line) in reversed(list(enumerate(result["lines"]))):
+        from_coord, to_coord = logic.move_to_coords(line[0])
+        draw_arrow(surface, (40, 120, 230, 200 - 50 * rank), square_center(from_coord), square_center(to_coord), max(10 - 3 * rank, 3))
+
+    font = pygame.font.Font(None, 30)
+    text = font.render(f"d{result['depth']} {score:+.2f}", True, (255, 255, 255), (30, 30, 30))
+    surface.blit(text, (18, HEIGHT - text.get_height() - 6))
+    return surface
+
+def draw_analysis(result):
+    if result is None:
+        return
+    if analysis_overlay["result"] is not result:
+        analysis_overlay["result"], analysis_overlay["surface"] = result, render_analysis(result)
+    screen.blit(analysis_overlay["surface"], (0, 0))
+
 
 
 def logic_output(chess_coord, piece_type, piece_color, current_positions):
@@ -148,9 +184,8 @@ def logic_output(chess_coord, piece_type, piece_color, current_positions):
         row, col = chess_to_indices(move)
         highlight_move(row, col)
 
-def timer_thread(timer_length):
-    global white_time_left, black_time_left, timer_running
-    white_time_left, black_time_left = timer_length, timer_length
+def timer_thread():
+    global white_time_left, black_time_left
     while timer_running:
         time.sleep(1)
         with turn_lock:
@@ -160,10 +195,11 @@ def timer_thread(timer_length):
                 black_time_left -= 1
         logger.debug(f"White time left: {white_time_left}, Black time left: {black_time_left}")
 
-def start_timer(timer_length):
-    global timer_running
+def start_timer(white_time, black_time):
+    global timer_running, white_time_left, black_time_left
+    white_time_left, black_time_left = white_time, black_time
     timer_running = True
-    threading.Thread(target=timer_thread, args=(timer_length,), daemon=True).start()
+    threading.Thread(target=timer_thread, daemon=True).start()
 
 def stop_timer():
     global timer_running
@@ -172,23 +208,21 @@ def stop_timer():
 def promotion_handler(new_chess_coord, piece_color, current_positions):
     logger.debug(f"Pawn reached the last row at {new_chess_coord}. Promoting...")
     promoted_piece = promotion_choice(WIDTH, HEIGHT, player)
-    current_positions[piece_color]['pawn'].remove(new_chess_coord)
-    current_positions[piece_color].setdefault(promoted_piece, []).append(new_chess_coord)
+    logic.promote(current_positions, piece_color, new_chess_coord, promoted_piece)
     print(f"Pawn promoted to {promoted_piece} at {new_chess_coord}.")
+    return promoted_piece
 
 def check_game_over_by_time(white_time_left, black_time_left, player):
-    global timer_running
+    global timer_running, winner
     # logger.debug(f"Checking timer ({timer_running}) lenght: {white_time_left} && {black_time_left}")
     if white_time_left == 0:
         winner = "Black"
         print(f"GameOver. {winner} wins by time.")
-        game_over(winner, WIDTH, HEIGHT)
         timer_running = False
         return True
     elif black_time_left == 0:
         winner = "White"
         print(f"!GameOver. {winner} wins by time.")
-        game_over(winner, WIDTH, HEIGHT)
         timer_running = False
         return True
     return False
@@ -199,57 +233,110 @@ def checkmate_detector(player_color, current_positions):
         return True
     return False
 
+def open_journal():
+    """
+    Resume the unfinished game left in the journal, or return None to start a new one.
+    """
+    state = journal.restore(JOURNAL_PATH)
+    if state is None or state["finished"]:
+        return None
+    logger.info(f"Restoring unfinished game at ply {state['ply']}")
+    return state, journal.JournalWriter.resume(JOURNAL_PATH, state["ply"])
+
+def archive_journal(game_journal):
+    game_journal.close()
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    # Games can end within the same second: the name gets a random suffix, and it is reserved
+    # with O_EXCL first so an existing archive is never overwritten
+    while True:
+        archived_path = os.path.join(ARCHIVE_DIR, f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}.acpj")
+        try:
+            os.close(os.open(archived_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            break
+        except FileExistsError:
+            continue
+    os.replace(JOURNAL_PATH, archived_path)
+
+    # Incremental append, no rebuild needed
+    with position_index.PositionIndex() as index:
+        index.add_game(archived_path)
+
 def main():
-    global player, winner
+    global player, winner, white_time_left, black_time_left
 
     # Main menu screen
     screen = pygame.display.set_mode((WIDTH, HEIGHT))
     timer_length, singleplayer = main_menu(screen)
     timer_length *= 60
 
+    player, winner = 'white', None
+    current_positions = copy.deepcopy(INITIAL_POSITIONS)
+    white_time_left = black_time_left = timer_length
+
+    restored = open_journal()
+    if restored:
+        state, game_journal = restored
+        current_positions, player = state["positions"], state["player"]
+        singleplayer = state["singleplayer"]
+        if state["white_time_left"] is not None:
+            white_time_left, black_time_left = state["white_time_left"], state["black_time_left"]
+            timer_length = max(timer_length, 1)
+    else:
+        game_journal = journal.JournalWriter(JOURNAL_PATH, singleplayer=singleplayer)
+        game_journal.record_snapshot(current_positions, player)
 
     pieces = load_pieces()
     positions = {
         f"{color}-{piece}-{coord}": coord
-        for color, pieces_dict in INITIAL_POSITIONS.items()
+        for color, pieces_dict in current_positions.items()
         for piece, coords in pieces_dict.items()
         for coord in coords
     }
 
-     # Initialize timers
-    white_time_left = timer_length
-    black_time_left = timer_length
-
     running = True
+    restart = False
     selected_square = None
     valid_piece_selected = False
-    current_positions = INITIAL_POSITIONS
     possible_moves = []
     chess_coord = None
     piece_color = None
     piece_type = None
     move_made = False
     timer_on = False
+    analyzer = None
 
     # Start timer when the game begins
     if timer_length > 0:
         timer_on = True
         print(f"Timer length: {timer_length}")
-        start_timer(timer_length)
+        start_timer(white_time_left, black_time_left)
 
     while running:
         if move_made:  # Check for checkmate (soon)
             if checkmate_detector(player, current_positions) or (timer_on and check_game_over_by_time(white_time_left, black_time_left, player)):
-                if winner is not None:
+                if winner is None:
                     winner = "Black" if player == "white" else "White"
                 print(f"GameOver. {winner} wins.")
-                game_over(winner, WIDTH, HEIGHT)
+                stop_timer()
+                if analyzer:
+                    analyzer.close()
+                game_journal.record_end(winner)
+                archive_journal(game_journal)
+                restart = game_over(winner, WIDTH, HEIGHT)
                 running = False  # End the game loop
                 break  # Exit the event loop
 
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
                 running = False
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_a:
+                # Toggle live analysis of the current position
+                if analyzer:
+                    analyzer.close()
+                    analyzer = None
+                else:
+                    analyzer = Analyzer()
+                    analyzer.set_position(current_positions, player)
             elif event.type == pygame.MOUSEBUTTONDOWN:
                 pos = pygame.mouse.get_pos()
                 col, row = pos[0] // SQUARE_SIZE, pos[1] // SQUARE_SIZE
@@ -263,20 +350,17 @@ def main():
                         movement_sound.play()
 
                         print(f"Moving {piece_color} {piece_type} from {chess_coord} to {new_chess_coord}")
-                        current_positions[piece_color][piece_type].remove(chess_coord)
-                        current_positions[piece_color][piece_type].append(new_chess_coord)
-
+                        # Moves the piece and removes captured pieces
+                        logic.apply_move(current_positions, piece_color, piece_type, chess_coord, new_chess_coord)
+                        game_journal.record_move(piece_color, piece_type, chess_coord, new_chess_coord)
 
                         # Handle promotion
                         if piece_type == 'pawn' and (new_chess_coord.endswith('8') or new_chess_coord.endswith('1')):
-                            promotion_handler(new_chess_coord, piece_color, current_positions)
+                            promoted_piece = promotion_handler(new_chess_coord, piece_color, current_positions)
+                            game_journal.record_promotion(new_chess_coord, promoted_piece)
 
-                        # Remove captured pieces
-                        for enemy_color in current_positions:
-                            if enemy_color != piece_color:
-                                for enemy_piece, enemy_positions in current_positions[enemy_color].items():
-                                    if new_chess_coord in enemy_positions:
-                                        enemy_positions.remove(new_chess_coord)
+                        if timer_on:
+                            game_journal.record_clock(white_time_left, black_time_left)
 
                         positions = {
                             f"{color}-{piece}-{coord}": coord
@@ -294,6 +378,12 @@ def main():
                         else:
                             ai.ai_initialization(positions, player)
                             move_made = False
+
+                        if game_journal.snapshot_due():
+                            game_journal.record_snapshot(current_positions, player)
+
+                        if analyzer:
+                            analyzer.set_position(current_positions, player)
                             
                     else:
                         print(f"Invalid move to {new_chess_coord}")
@@ -324,6 +414,9 @@ def main():
                 row, col = chess_to_indices(move)
                 highlight_move(row, col)
 
+        if analyzer:
+            draw_analysis(analyzer.latest())
+
         font = pygame.font.Font(None, 50)
         opacity = 180
 
@@ -342,6 +435,12 @@ def main():
         pygame.display.flip()
         clock.tick(FPS)
 
+    if restart:
+        return main()
+
+    if analyzer:
+        analyzer.close()
+    game_journal.close()
     pygame.quit()
     sys.exit()
 
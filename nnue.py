@@ -0,0 +1,189 @@
+import os
+import time
+from typing import Dict
+
+try:
+    import numpy as np
+except ImportError:  # The engine falls back to the classical evaluation
+    np = None
+
+from ai import MAX_MOVES, MAX_PLY  # Accumulator stack and batch match the search's ply and move buffers
+from logic import COLORS, PIECE_TYPES, PROMOTION_FLAG, PROMOTION_OFFSETS
+
+# Network shape: 768 piece-square features -> HIDDEN x 2 perspectives -> L1 -> 1
+FEATURES = len(COLORS) * len(PIECE_TYPES) * 64
+HIDDEN = 128
+L1 = 32
+QA = 255  # Clipped-ReLU ceiling of the quantized activations
+QB = 64   # Scale of the quantized hidden and output weights
+
+def feature_index(perspective: int, code: int, square: int) -> int:
+    """
+    Index of a piece-square feature (mailbox piece code, square 0-63) as seen by perspective (0 white, 1 black).
+    The black perspective swaps colors and mirrors the board vertically.
+    """
+    color_index, piece = divmod(code - 1, 6)
+    return (color_index ^ perspective) * 384 + piece * 64 + (square ^ (56 * perspective))
+
+def load_network(path: str) -> Dict[str, "np.ndarray"]:
+    """
+    Load a quantized network from an .npz file holding int16 weights and int32 biases.
+    """
+    expected = {
+        "ft_weight": ((FEATURES, HIDDEN), np.int16),
+        "ft_bias": ((HIDDEN,), np.int16),
+        "l1_weight": ((2 * HIDDEN, L1), np.int16),
+        "l1_bias": ((L1,), np.int32),
+        "l2_weight": ((L1,), np.int16),
+        "l2_bias": ((), np.int32),
+    }
+    with np.load(path) as data:
+        network = {}
+        for name, (shape, dtype) in expected.items():
+            if name not in data or data[name].shape != shape:
+                raise ValueError(f"Invalid NNUE network {path}: bad or missing {name}")
+            network[name] = data[name].astype(dtype)
+    return network
+
+def random_network(path: str, seed: int = 0):
+    """
+    Write a random network with the expected layout, for benchmarking and smoke tests.
+    """
+    rng = np.random.default_rng(seed)
+    np.savez(
+        path,
+        ft_weight=rng.integers(-32, 32, (FEATURES, HIDDEN), dtype=np.int16),
+        ft_bias=rng.integers(0, 64, HIDDEN, dtype=np.int16),
+        l1_weight=rng.integers(-16, 16, (2 * HIDDEN, L1), dtype=np.int16),
+        l1_bias=rng.integers(-1024, 1024, L1, dtype=np.int32),
+        l2_weight=rng.integers(-32, 32, L1, dtype=np.int16),
+        l2_bias=np.int32(0),
+    )
+
+class NNUE:
+    """
+    Efficiently updatable evaluator. The first layer lives in a preallocated stack of
+    accumulators: make_move pushes and applies the feature deltas, unmake_move pops.
+    """
+    def __init__(self, network: Dict[str, "np.ndarray"]):
+        self.ft_weight = network["ft_weight"]
+        self.ft_bias = network["ft_bias"]
+        self.l1_weight = network["l1_weight"].astype(np.int32)
+        self.l1_bias = network["l1_bias"]
+        self.l2_weight = network["l2_weight"].astype(np.int32)
+        self.l2_bias = network["l2_bias"]
+        self.stack = np.zeros((MAX_PLY, 2, HIDDEN), dtype=np.int16)
+        self.batch = np.zeros((MAX_MOVES, 2, HIDDEN), dtype=np.int16)
+        self.top = 0
+
+    def refresh(self, squares: list):
+        """
+        Rebuild the accumulator from a mailbox from scratch, e.g. at the root of a search.
+        """
+        self.top = 0
+        for perspective in (0, 1):
+            indices = [feature_index(perspective, code, square) for square, code in enumerate(squares) if code]
+            self.stack[0, perspective] = self.ft_bias + self.ft_weight[indices].sum(axis=0, dtype=np.int16)
+
+    def push(self):
+        self.stack[self.top + 1] = self.stack[self.top]
+        self.top += 1
+
+    def pop(self):
+        self.top -= 1
+
+    def _apply(self, accumulator: "np.ndarray", piece: int, new_piece: int, from_square: int, to_square: int, captured: int):
+        weight = self.ft_weight
+        for perspective in (0, 1):
+            row = accumulator[perspective]
+            row += weight[feature_index(perspective, new_piece, to_square)]
+            row -= weight[feature_index(perspective, piece, from_square)]
+            if captured:
+                row -= weight[feature_index(perspective, captured, to_square)]
+
+    def update(self, piece: int, new_piece: int, from_square: int, to_square: int, captured: int):
+        """
+        Apply the feature changes of a move to the current accumulator.
+        """
+        self._apply(self.stack[self.top], piece, new_piece, from_square, to_square, captured)
+
+    def forward(self, accumulators: "np.ndarray", player: str) -> "np.ndarray":
+        """
+        Evaluate a batch of accumulators of shape (N, 2, HIDDEN) with player to move.
+        Returns scores in pawns from white's point of view.
+        """
+        if player == "black":
+            accumulators = accumulators[:, ::-1]
+        x = np.clip(accumulators.reshape(len(accumulators), 2 * HIDDEN), 0, QA).astype(np.int32)
+        hidden = np.clip((x @ self.l1_weight + self.l1_bias) // QB, 0, QA)
+        output = (hidden @ self.l2_weight + self.l2_bias) / (QA * QB)
+        return output if player == "white" else -output
+
+    def evaluate(self, player: str = "white") -> float:
+        return float(self.forward(self.stack[self.top:self.top + 1], player)[0])
+
+    def evaluate_children(self, squares: list, moves, start: int, end: int, player: str) -> "np.ndarray":
+        """
+        Evaluate the positions reached by the packed moves in moves[start:end] in one call;
+        player is the side to move in those positions.
+        """
+        count = end - start
+        batch = self.batch[:count]
+        batch[:] = self.stack[self.top]
+        for i in range(count):
+            move = moves[start + i]
+            from_square, to_square = move & 63, (move >> 6) & 63
+            piece = squares[from_square]
+            new_piece = piece + PROMOTION_OFFSETS[(move >> 12) & 3] if move & PROMOTION_FLAG else piece
+            self._apply(batch[i], piece, new_piece, from_square, to_square, squares[to_square])
+        return self.forward(batch, player)
+
+def benchmark_boards(count: int = 8, plies: int = 16, seed: int = 0) -> list:
+    """
+    (board, player) pairs reached by random playouts from the initial position, for repeatable benchmarks.
+    """
+    import random
+    import ai
+    from logic import INITIAL_POSITIONS
+
+    rng = random.Random(seed)
+    boards = [(ai.SearchBoard(INITIAL_POSITIONS, "white"), "white")]
+    while len(boards) < count:
+        board, player = ai.SearchBoard(INITIAL_POSITIONS, "white"), "white"
+        for _ in range(rng.randint(plies // 2, plies)):
+            moves = ai.generate_moves(board, player)
+            if not moves:
+                break
+            ai.make_move(board, rng.choice(moves))
+            player = "black" if player == "white" else "white"
+        boards.append((board, player))
+    return boards
+
+def benchmark(depth: int = 4, path: str = os.path.join("assets", "nnue-bench.npz"), count: int = 8):
+    """
+    Compare the classical and the neural evaluation by time to depth: iterative deepening to depth
+    on the same positions. Nodes are interior nodes for both, so the NPS figures are comparable.
+    """
+    import ai
+
+    if not os.path.exists(path):
+        random_network(path)
+    evaluator = NNUE(load_network(path))
+    boards = benchmark_boards(count)
+
+    for name, search_evaluator in (("classical", None), ("nnue", evaluator)):
+        ai.nodes_searched = 0
+        start = time.perf_counter()
+        for board, player in boards:
+            if search_evaluator is not None:
+                search_evaluator.refresh(board.squares)
+            for iteration in range(1, depth + 1):
+                ai.minimax(board, iteration, float("-inf"), float("inf"), player == "white", search_evaluator)
+        elapsed = time.perf_counter() - start
+        print(
+            f"{name:>9}: depth {depth} on {len(boards)} positions in {elapsed:.2f}s "
+            f"({elapsed / len(boards) * 1000:.0f} ms per position, {ai.nodes_searched} nodes, {ai.nodes_searched / elapsed:.0f} NPS)"
+        )
+
+if __name__ == "__main__":
+    benchmark()
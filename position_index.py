@@ -0,0 +1,208 @@
+import os
+import sqlite3
+from collections import Counter
+from multiprocessing import Pool
+from typing import Dict, List, Optional, Tuple
+
+import journal
+import logic
+
+INDEX_PATH = os.path.join("saves", "positions.sqlite")
+ARCHIVE_DIR = os.path.join("saves", "archive")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS games (
+    id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE NOT NULL,
+    winner TEXT
+);
+CREATE TABLE IF NOT EXISTS positions (
+    hash INTEGER NOT NULL,
+    game_id INTEGER NOT NULL,
+    ply INTEGER NOT NULL,
+    next_move TEXT
+);
+-- Covering index: lookups by hash never touch the positions table itself
+CREATE INDEX IF NOT EXISTS positions_by_hash ON positions (hash, next_move, game_id, ply);
+"""
+
+def encode_move(from_coord: str, to_coord: str, promotion: Optional[str]) -> str:
+    """
+    Encode a move as 'e2e4', with the promoted piece's letter appended (e.g. 'e7e8q').
+    """
+    suffix = "n" if promotion == "knight" else promotion[0] if promotion else ""
+    return f"{from_coord}{to_coord}{suffix}"
+
+def game_entries(path: str) -> Tuple[str, Optional[str], List[Tuple[int, int, Optional[str]]]]:
+    """
+    Replay a journal with the logic move generator and return (path, winner, [(hash, ply, next move)]).
+    Replay stops at the first move the generator does not allow.
+    """
+    entries = []
+    winner = None
+    positions, player, ply = None, None, 0
+    singleplayer = False
+    pending = None  # Move waiting for a possible promotion record
+
+    def flush():
+        nonlocal pending, player, ply
+        piece_color, piece_type, from_coord, to_coord, promotion = pending
+        entries.append((logic.zobrist_hash(positions, player), ply, encode_move(from_coord, to_coord, promotion)))
+        logic.apply_move(positions, piece_color, piece_type, from_coord, to_coord)
+        if promotion:
+            logic.promote(positions, piece_color, to_coord, promotion)
+        if not singleplayer:
+            player = "black" if piece_color == "white" else "white"
+        ply += 1
+        pending = None
+
+    with journal.JournalReader(path) as reader:
+        singleplayer = reader.singleplayer
+        for record in reader.records():
+            kind = record[0]
+            if kind == journal.SNAPSHOT and positions is None:
+                _, ply, player, positions = record
+            elif kind == journal.MOVE and positions is not None:
+                if pending:
+                    flush()
+                _, piece_color, piece_type, from_coord, to_coord = record
+                if from_coord not in positions[piece_color][piece_type] or \
+                        to_coord not in logic.movement_schema(from_coord, piece_type, piece_color, positions):
+                    break
+                pending = [piece_color, piece_type, from_coord, to_coord, None]
+            elif kind == journal.PROMOTION and pending:
+                pending[4] = record[2]
+            elif kind == journal.END:
+                winner = record[1]
+        if pending:
+            flush()
+
+    if positions is not None:
+        entries.append((logic.zobrist_hash(positions, player), ply, None))
+    return path, winner, entries
+
+def _safe_game_entries(path: str):
+    try:
+        return game_entries(path)
+    except journal.JournalError:
+        return None
+
+class PositionIndex:
+    def __init__(self, path: str = INDEX_PATH):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def indexed_paths(self) -> set:
+        return {row[0] for row in self.connection.execute("SELECT path FROM games")}
+
+    def _insert(self, path: str, winner: Optional[str], entries: list):
+        cursor = self.connection.execute("INSERT INTO games (path, winner) VALUES (?, ?)", (path, winner))
+        game_id = cursor.lastrowid
+        self.connection.executemany(
+            "INSERT INTO positions (hash, game_id, ply, next_move) VALUES (?, ?, ?, ?)",
+            ((key, game_id, ply, move) for key, ply, move in entries),
+        )
+
+    def add_game(self, path: str) -> bool:
+        """
+        Index a single game; already indexed games are skipped, so this is safe to call after every game.
+        """
+        path = os.path.abspath(path)
+        if self.connection.execute("SELECT 1 FROM games WHERE path = ?", (path,)).fetchone():
+            return False
+        result = _safe_game_entries(path)
+        if result is None:
+            return False
+        with self.connection:
+            self._insert(*result)
+        return True
+
+    def add_entries(self, path: str, winner: Optional[str], entries: list) -> bool:
+        """
+        Index a game from rows game_entries produced elsewhere, e.g. on a distributed worker.
+        Already indexed games are skipped.
+        """
+        path = os.path.abspath(path)
+        if self.connection.execute("SELECT 1 FROM games WHERE path = ?", (path,)).fetchone():
+            return False
+        with self.connection:
+            self._insert(path, winner, entries)
+        return True
+
+    def build(self, directory: str = ARCHIVE_DIR, processes: Optional[int] = None) -> int:
+        """
+        Index every journal in a directory that is not indexed yet, replaying games across processes.
+        Returns the number of games added.
+        """
+        indexed = self.indexed_paths()
+        paths = [
+            os.path.abspath(os.path.join(directory, name))
+            for name in sorted(os.listdir(directory))
+            if name.endswith(".acpj")
+        ]
+        paths = [path for path in paths if path not in indexed]
+        if not paths:
+            return 0
+
+        added = 0
+        with Pool(processes) as pool, self.connection:
+            for result in pool.imap_unordered(_safe_game_entries, paths, chunksize=16):
+                if result is not None:
+                    self._insert(*result)
+                    added += 1
+        return added
+
+    def query(self, positions: Dict[str, Dict[str, list]], player: str) -> List[Tuple[int, int, Optional[str]]]:
+        """
+        Return (game id, ply, next move) for every indexed game that reached this position.
+        """
+        return self.connection.execute(
+            "SELECT game_id, ply, next_move FROM positions WHERE hash = ?",
+            (logic.zobrist_hash(positions, player),),
+        ).fetchall()
+
+    def explore(self, positions: Dict[str, Dict[str, list]], player: str) -> Dict[str, Dict[str, int]]:
+        """
+        Opening explorer statistics: for each next move, how often it was played and how those games ended.
+        """
+        stats = {}
+        rows = self.connection.execute(
+            "SELECT p.next_move, g.winner FROM positions p JOIN games g ON g.id = p.game_id "
+            "WHERE p.hash = ? AND p.next_move IS NOT NULL",
+            (logic.zobrist_hash(positions, player),),
+        )
+        for move, winner in rows:
+            move_stats = stats.setdefault(move, Counter(played=0, white=0, black=0, unfinished=0))
+            move_stats["played"] += 1
+            move_stats[winner or "unfinished"] += 1
+        return {move: dict(move_stats) for move, move_stats in stats.items()}
+
+    def book_move(self, positions: Dict[str, Dict[str, list]], player: str, min_games: int = 3) -> Optional[str]:
+        """
+        Pick the book move with the best score for player among moves played at least min_games times.
+        """
+        opponent = "black" if player == "white" else "white"
+        best_move, best_score = None, None
+        for move, move_stats in self.explore(positions, player).items():
+            if move_stats["played"] < min_games:
+                continue
+            score = (move_stats[player] - move_stats[opponent]) / move_stats["played"]
+            if best_score is None or score > best_score:
+                best_move, best_score = move, score
+        return best_move
+
+if __name__ == "__main__":
+    with PositionIndex() as index:
+        print(f"Indexed {index.build()} new games.")
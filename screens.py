@@ -160,6 +160,7 @@ def promotion_choice(WIDTH, HEIGHT, color):
 def game_over(winner: str, WIDTH, HEIGHT):
     """
     Display a game-over screen.
+    Returns True if the player asked to restart.
     """
     font = pygame.font.Font(None, 80)
     text = f"{winner} wins!"
@@ -196,7 +197,7 @@ def game_over(winner: str, WIDTH, HEIGHT):
                 sys.exit()
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_r:
-                    pass  # Restart the game
+                    return True  # Restart the game
                 elif event.key == pygame.K_ESCAPE:
                     pygame.quit()
                     sys.exit()
@@ -0,0 +1,80 @@
+import copy
+import random
+
+import ai
+import logic
+
+def random_positions(rng, pieces=12):
+    """
+    Both kings plus random pieces on random squares; pawns never stand on the first or last row.
+    """
+    squares = rng.sample(range(64), pieces + 2)
+    positions = {color: {piece: [] for piece in logic.PIECE_TYPES} for color in logic.COLORS}
+    positions["white"]["king"].append(logic.index_to_coord(squares[0]))
+    positions["black"]["king"].append(logic.index_to_coord(squares[1]))
+    for square in squares[2:]:
+        piece = rng.choice(logic.PIECE_TYPES[:5])
+        if piece == "pawn" and square // 8 in (0, 7):
+            piece = "knight"
+        positions[rng.choice(logic.COLORS)][piece].append(logic.index_to_coord(square))
+    return positions
+
+def schema_moves(positions, color):
+    on_board = set(logic.index_to_coord(square) for square in range(64))
+    return {
+        (coord, target)
+        for piece, coords in positions[color].items()
+        for coord in coords
+        for target in logic.movement_schema(coord, piece, color, positions)
+        if target in on_board
+    }
+
+def packed_moves(positions, color):
+    board = ai.SearchBoard(positions, color)
+    return ai.generate_moves(board, color)
+
+def test_packed_moves_match_movement_schema():
+    rng = random.Random(0)
+    for _ in range(300):
+        positions = random_positions(rng, rng.randint(2, 24))
+        for color in logic.COLORS:
+            moves = packed_moves(positions, color)
+            assert {logic.move_to_coords(move) for move in moves} == schema_moves(positions, color)
+
+def test_every_promotion_piece_is_generated():
+    positions = {"white": {"pawn": ["e7"], "king": ["a1"]}, "black": {"rook": ["d8"], "king": ["h1"]}}
+    moves = [logic.move_to_string(move) for move in packed_moves(positions, "white")]
+    assert sorted(move for move in moves if len(move) == 5) == sorted(
+        f"e7{target}{letter}" for target in ("e8", "d8") for letter in "qrbn"
+    )
+
+def test_pawn_on_final_row_has_no_moves():
+    positions = {"white": {"pawn": ["a8"], "king": ["e1"]}, "black": {"pawn": ["h1"], "king": ["e8"]}}
+    for color, square in (("white", "a8"), ("black", "h1")):
+        moves = packed_moves(positions, color)
+        assert all(logic.move_to_coords(move)[0] != square for move in moves)
+        assert ai.ai_move(positions, 2, color, use_nnue=False) is not None
+
+def test_make_unmake_round_trip():
+    rng = random.Random(1)
+    for _ in range(100):
+        positions = random_positions(rng, rng.randint(2, 24))
+        for color in logic.COLORS:
+            board = ai.SearchBoard(positions, color)
+            before = (list(board.squares), board.hash, board.material)
+            for move in ai.generate_moves(board, color):
+                captured = ai.make_move(board, move)
+
+                # The incremental board must equal one built from scratch after the move
+                expected = copy.deepcopy(positions)
+                from_coord, to_coord = logic.move_to_coords(move)
+                piece = logic.PIECE_TYPES[(board.squares[move >> 6 & 63] - 1) % 6]
+                moved = "pawn" if move & logic.PROMOTION_FLAG else piece
+                logic.apply_move(expected, color, moved, from_coord, to_coord)
+                if move & logic.PROMOTION_FLAG:
+                    logic.promote(expected, color, to_coord, piece)
+                reference = ai.SearchBoard(expected, "black" if color == "white" else "white")
+                assert (board.squares, board.hash, board.material) == (reference.squares, reference.hash, reference.material)
+
+                ai.unmake_move(board, move, captured)
+                assert (board.squares, board.hash, board.material) == before
@@ -0,0 +1,207 @@
+import json
+import os
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import ai
+import journal
+import logic
+import position_index
+
+DATA_PATH = os.path.join("saves", "tuning.bin")
+
+CHUNK_SIZE = 1 << 20
+# Adam step size and moment decay rates
+LEARNING_RATE = 0.05
+BETA1, BETA2, EPSILON = 0.9, 0.999, 1e-8
+MAX_EPOCHS = 5000
+TOLERANCE = 1e-9  # Stop once an epoch improves the error by less than this
+K_ROUNDS = 5  # Times tuning may resume after the refit of k moved it
+# One row per quiet position: white-minus-black count of each piece type, then the game result
+RECORD = np.dtype([("features", np.int8, (len(logic.PIECE_TYPES),)), ("result", np.float32)])
+# Kings are always on the board, so their difference carries no signal and their value is kept fixed.
+# The pawn is the unit: only k scales the whole evaluation, otherwise k and the weights trade off freely.
+TUNED = np.array([piece not in ("pawn", "king") for piece in logic.PIECE_TYPES])
+
+def is_quiet(positions: Dict[str, Dict[str, list]], player: str) -> bool:
+    """
+    A position is quiet if the side to move has no capture available.
+    """
+    for piece, coords in positions[player].items():
+        for coord in coords:
+            for move in logic.movement_schema(coord, piece, player, positions):
+                if logic.is_enemy_piece(move, player, positions):
+                    return False
+    return True
+
+def position_features(positions: Dict[str, Dict[str, list]]) -> np.ndarray:
+    return np.array(
+        [len(positions["white"].get(piece, [])) - len(positions["black"].get(piece, [])) for piece in logic.PIECE_TYPES],
+        dtype=np.int8,
+    )
+
+def game_features(path: str) -> Tuple[Optional[str], List[np.ndarray]]:
+    """
+    Return (winner, features of every quiet position) of a journal, decoded in a single pass.
+    A position is checked once the next move arrives, so a promotion record has been applied to it.
+    """
+    winner, features = None, []
+    positions = player = last_mover = None
+
+    def add_if_quiet():
+        if is_quiet(positions, player):
+            features.append(position_features(positions))
+
+    with journal.JournalReader(path) as reader:
+        for record in reader.records():
+            kind = record[0]
+            if kind == journal.SNAPSHOT and positions is None:
+                _, _, player, positions = record
+            elif kind == journal.MOVE and positions is not None:
+                add_if_quiet()
+                _, last_mover, piece_type, from_coord, to_coord = record
+                logic.apply_move(positions, last_mover, piece_type, from_coord, to_coord)
+                if not reader.singleplayer:
+                    player = "black" if last_mover == "white" else "white"
+            elif kind == journal.PROMOTION and last_mover:
+                _, chess_coord, promoted_piece = record
+                logic.promote(positions, last_mover, chess_coord, promoted_piece)
+            elif kind == journal.END:
+                winner = record[1]
+                break
+    if positions is not None:
+        add_if_quiet()
+    return winner, features
+
+def extract(directory: str = position_index.ARCHIVE_DIR, out_path: str = DATA_PATH) -> int:
+    """
+    Write one record per quiet position of every finished game in directory.
+    Records are flushed in chunks so memory stays bounded. Returns the number of positions.
+    """
+    total = 0
+    buffer = np.zeros(CHUNK_SIZE, dtype=RECORD)
+    filled = 0
+    with open(out_path, "wb") as out:
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(".acpj"):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                winner, features = game_features(path)
+            except journal.JournalError:
+                continue
+            if winner is None:
+                continue
+            result = 1.0 if winner == "white" else 0.0
+            for row in features:
+                buffer[filled] = (row, result)
+                filled += 1
+                if filled == CHUNK_SIZE:
+                    out.write(buffer.tobytes())
+                    total += filled
+                    filled = 0
+        out.write(buffer[:filled].tobytes())
+        total += filled
+    return total
+
+def chunks(data_path: str = DATA_PATH, chunk_size: int = CHUNK_SIZE) -> Iterator[np.ndarray]:
+    data = np.memmap(data_path, dtype=RECORD, mode="r")
+    for start in range(0, len(data), chunk_size):
+        yield data[start:start + chunk_size]
+
+def predict(features: np.ndarray, weights: np.ndarray, k: float) -> np.ndarray:
+    """
+    Expected score for white given the evaluation, in the Texel logistic form.
+    """
+    return 1.0 / (1.0 + 10.0 ** (-k * (features @ weights) / 4.0))
+
+def error(weights: np.ndarray, k: float, data_path: str = DATA_PATH) -> float:
+    total, count = 0.0, 0
+    for chunk in chunks(data_path):
+        features = chunk["features"].astype(np.float64)
+        total += float(np.sum((chunk["result"] - predict(features, weights, k)) ** 2))
+        count += len(chunk)
+    return total / max(count, 1)
+
+def fit_k(weights: np.ndarray, data_path: str = DATA_PATH) -> float:
+    """
+    Find the scaling constant that best maps the current evaluation onto game results.
+    """
+    candidates = np.linspace(0.1, 3.0, 30)
+    best = min(candidates, key=lambda k: error(weights, k, data_path))
+    # Golden-section search between the grid neighbours of the best candidate
+    low, high = max(best - 0.1, 0.01), best + 0.1
+    ratio = (np.sqrt(5.0) - 1.0) / 2.0
+    while high - low > 1e-4:
+        left, right = high - ratio * (high - low), low + ratio * (high - low)
+        if error(weights, left, data_path) < error(weights, right, data_path):
+            high = right
+        else:
+            low = left
+    return float((low + high) / 2.0)
+
+def gradient(weights: np.ndarray, k: float, data_path: str = DATA_PATH) -> Tuple[float, np.ndarray, float]:
+    """
+    Mean squared error and its gradients with respect to the weights and to k, in one pass over the data.
+    """
+    total, grad, k_grad, count = 0.0, np.zeros_like(weights), 0.0, 0
+    for chunk in chunks(data_path):
+        features = chunk["features"].astype(np.float64)
+        evaluation = features @ weights
+        predicted = 1.0 / (1.0 + 10.0 ** (-k * evaluation / 4.0))
+        residual = chunk["result"] - predicted
+        slope = -2.0 * residual * predicted * (1.0 - predicted) * (np.log(10.0) / 4.0)
+        total += float(residual @ residual)
+        grad += k * (slope @ features)
+        k_grad += float(slope @ evaluation)
+        count += len(chunk)
+    count = max(count, 1)
+    return total / count, grad / count, k_grad / count
+
+def tune(
+    weights: np.ndarray,
+    data_path: str = DATA_PATH,
+    learning_rate: float = LEARNING_RATE,
+    max_epochs: int = MAX_EPOCHS,
+    tolerance: float = TOLERANCE,
+    k_rounds: int = K_ROUNDS,
+) -> Tuple[np.ndarray, float]:
+    """
+    Full-batch Adam on the mean squared error over the weights and k together, streaming the data
+    chunk by chunk every epoch, until an epoch improves the error by less than tolerance.
+    k is then refit on its own for the tuned weights; if that moves it, tuning resumes from there.
+    Returns (weights, k).
+    """
+    params = np.append(weights.astype(np.float64), fit_k(weights, data_path))
+    mask = np.append(TUNED, True)
+    for _ in range(k_rounds):
+        first, second = np.zeros_like(params), np.zeros_like(params)
+        previous = float("inf")
+        for epoch in range(1, max_epochs + 1):
+            mse, grad, k_grad = gradient(params[:-1], params[-1], data_path)
+            if abs(previous - mse) < tolerance:
+                break
+            previous = mse
+            grad = np.where(mask, np.append(grad, k_grad), 0.0)
+            first = BETA1 * first + (1.0 - BETA1) * grad
+            second = BETA2 * second + (1.0 - BETA2) * grad * grad
+            step = (first / (1.0 - BETA1 ** epoch)) / (np.sqrt(second / (1.0 - BETA2 ** epoch)) + EPSILON)
+            params -= learning_rate * step
+        refit = fit_k(params[:-1], data_path)
+        converged = abs(refit - params[-1]) < 1e-3
+        params[-1] = refit
+        if converged:
+            break
+    return params[:-1], float(params[-1])
+
+def write_weights(weights: np.ndarray, path: str = ai.EVAL_WEIGHTS_PATH):
+    with open(path, "w") as weights_file:
+        json.dump({piece: round(float(value), 3) for piece, value in zip(logic.PIECE_TYPES, weights)}, weights_file, indent=4)
+
+if __name__ == "__main__":
+    print(f"Extracted {extract()} quiet positions.")
+    initial = np.array([ai.PIECE_VALUES[piece] for piece in logic.PIECE_TYPES], dtype=np.float64)
+    tuned, k = tune(initial)
+    write_weights(tuned)
+    print(f"Wrote {ai.EVAL_WEIGHTS_PATH} (k={k:.3f}): {dict(zip(logic.PIECE_TYPES, tuned.round(3)))}")